@@ -5,11 +5,16 @@ database.py
 Labrugis Ltd. 2025
 """
 
-import json
-import aiofiles
+import ijson
+import orjson
+import numpy as np
 import asyncio
-from typing import List, Optional, Dict, Any
+import itertools
+import os
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple
 from pathlib import Path
+from pydantic import TypeAdapter
 import uuid
 from datetime import datetime
 
@@ -19,13 +24,167 @@ from models import (
     FormularyTemplate, 
     PeptideData,
     IngredientFunction,
-    ProductType
+    PHRange,
+    INGREDIENT_LIST_ADAPTER,
+    PEPTIDE_MAP_ADAPTER,
+    TEMPLATE_MAP_ADAPTER,
+    TEMPLATE_LIST_ADAPTER,
+    INGREDIENT_FUNCTION_LOOKUP,
+    PRODUCT_TYPE_LOOKUP
 )
+from defaults import (
+    get_default_ingredients,
+    get_default_peptides,
+    get_default_templates,
+    get_default_regulatory_data
+)
+
+
+def _load_json_file(path: Path) -> Any:
+    """Read and decode a JSON file"""
+    return orjson.loads(path.read_bytes())
+
+
+def _validate_json_file(adapter: TypeAdapter, path: Path) -> Any:
+    """Read a JSON file and parse + validate it in one pass inside pydantic-core"""
+    return adapter.validate_json(path.read_bytes())
+
+
+def _dump_json_file(path: Path, data: Any):
+    """Encode to a sibling temp file, then atomically swap it into place"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, path)
+
+
+async def _read_json(path: Path) -> Any:
+    """Read and parse in one worker-thread hop, off the event loop"""
+    return await asyncio.to_thread(_load_json_file, path)
+
+
+async def _write_json(path: Path, data: Any):
+    """Encode and write in one worker-thread hop, off the event loop"""
+    await asyncio.to_thread(_dump_json_file, path, data)
+
+
+# Records on disk were written by this module, so they are rebuilt with
+# Ingredient.from_trusted (no validation); only enum and nested model fields
+# need rebuilding.
+def _construct_ingredient(data: Dict[str, Any]) -> Ingredient:
+    fields = dict(data, function=INGREDIENT_FUNCTION_LOOKUP[data["function"]])
+    # Optional keys may be absent from older records; model_construct fills defaults
+    ph_range = fields.get("ph_range")
+    if isinstance(ph_range, dict):
+        fields["ph_range"] = PHRange.from_trusted(ph_range)
+    return Ingredient.from_trusted(fields)
+
+
+def _stream_ingredients(
+    path: Path
+) -> Tuple[Dict[str, Ingredient], Dict[str, Dict[str, Any]]]:
+    """Parse the ingredient file record by record without buffering it.
+    
+    Also returns the decoded records that already carry every schema field:
+    they are exactly what model_dump(mode="json") would produce, so they can
+    be written back and served without going through Pydantic again.
+    """
+    ingredients: Dict[str, Ingredient] = {}
+    rows: Dict[str, Dict[str, Any]] = {}
+    fields = Ingredient.model_fields.keys()
+    with open(path, 'rb') as f:
+        for k, v in ijson.kvitems(f, '', use_float=True):
+            ingredients[k] = _construct_ingredient(v)
+            if v.keys() == fields:
+                rows[k] = v
+    return ingredients, rows
+
+
+class LRUCache(OrderedDict):
+    """Small bounded mapping that evicts the least recently used entry"""
+    
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+    
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+    
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def _intersect(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, None]:
+    """Ordered intersection of two id maps: walk the smaller, probe the larger"""
+    if len(b) < len(a):
+        a, b = b, a
+    return {i: None for i in a if i in b}
+
+
+# Small integer code per ingredient function, used to index NumPy lookup tables
+FUNCTION_CODES: Dict[IngredientFunction, int] = {
+    function: code for code, function in enumerate(IngredientFunction)
+}
+
+# Name/id keyword bits stored per ingredient in IngredientColumns.token_bits
+TOKEN_PEPTIDE = 1
+TOKEN_RETINOL = 2
+TOKEN_VITC = 4
+
+
+def _token_bits(ingredient: Ingredient) -> int:
+    """Keyword bits for one ingredient (name matched case-insensitively)"""
+    name = ingredient.name.lower()
+    bits = 0
+    if "peptide" in name:
+        bits |= TOKEN_PEPTIDE
+    if "retinol" in name:
+        bits |= TOKEN_RETINOL
+    if "vitamin_c" in ingredient.id:
+        bits |= TOKEN_VITC
+    return bits
+
+
+class IngredientColumns:
+    """Column-wise (SoA) NumPy snapshot of the ingredient catalogue
+    
+    Row ``n`` of every array describes ``items[n]``; missing numbers are NaN, so
+    range masks simply exclude them.
+    """
+    
+    def __init__(self, ingredients: Dict[str, Ingredient], version: int = 0):
+        self.version = version
+        self.items = list(ingredients.values())
+        self.rows = {i.id: n for n, i in enumerate(self.items)}
+        self.ids = np.array([i.id for i in self.items], dtype=object)
+        self.function_code = np.array(
+            [FUNCTION_CODES[i.function] for i in self.items], dtype=np.int8
+        )
+        self.natural_origin = np.array([i.natural_origin for i in self.items], dtype=bool)
+        self.cost_per_kg = np.array([i.cost_per_kg for i in self.items], dtype=np.float64)
+        self.max_concentration = np.array(
+            [i.max_concentration for i in self.items], dtype=np.float64
+        )
+        
+        # Name/id keyword bits used by request scoring (TOKEN_* flags)
+        self.token_bits = np.array([_token_bits(i) for i in self.items], dtype=np.uint32)
 
 
 class DatabaseManager:
     """Manages ingredient database and formulation templates"""
     
+    # Seconds to wait after a mutation so bursts of writes share one save
+    flush_delay = 0.05
+    # Seconds to wait before retrying a save that failed
+    retry_delay = 1.0
+    # Entries kept per query cache (filter combinations seen from the UI)
+    query_cache_size = 128
+    
     def __init__(self, data_path: str = "."):
         self.data_path = Path(data_path)
         self.ingredients_file = self.data_path / "ingredients.json"
@@ -38,23 +197,133 @@ class DatabaseManager:
         self.peptides: Dict[str, PeptideData] = {}
         self.templates: Dict[str, FormularyTemplate] = {}
         self.regulatory_data: Dict[str, Any] = {}
+        
+        # Secondary indexes: filter value -> ordered set of ids (dict keys)
+        self._by_category: Dict[str, Dict[str, None]] = {}
+        self._by_function: Dict[str, Dict[str, None]] = {}
+        self._templates_by_type: Dict[str, Dict[str, None]] = {}
+        self._inci_lower: Set[str] = set()
+        
+        # Bumped on every catalogue change; derived snapshots compare against it
+        self.catalog_version = 0
+        # Column snapshot for vectorised queries, rebuilt lazily after mutation
+        self._columns: Optional[IngredientColumns] = None
+        
+        # Query results and pre-serialized JSON responses, cleared on mutation
+        self._filter_cache = LRUCache(self.query_cache_size)
+        self._json_cache = LRUCache(self.query_cache_size)
+        # JSON-mode model_dump() of each ingredient, dropped when it changes
+        self._dump_cache: Dict[str, Dict[str, Any]] = {}
+        
+        # Pending writes, coalesced by a background flush task
+        self._savers = {
+            "ingredients": self._save_ingredients,
+            "peptides": self._save_peptides,
+            "templates": self._save_templates,
+            "regulatory": self._save_regulatory_data
+        }
+        self._dirty: Set[str] = set()
+        self._flush_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        # One flush at a time: saves share fixed <name>.json.tmp paths
+        self._flush_lock = asyncio.Lock()
     
     async def initialize(self):
         """Initialize database with default data"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        
         await self._load_all_data()
         
-        # Create default data if files don't exist
-        if not self.ingredients:
-            await self._create_default_ingredients()
+        # Create default data if files don't exist (independent files, so concurrently)
+        defaults = [
+            (self.ingredients, self._create_default_ingredients),
+            (self.peptides, self._create_default_peptides),
+            (self.templates, self._create_default_templates),
+            (self.regulatory_data, self._create_regulatory_data)
+        ]
+        await asyncio.gather(*(create() for loaded, create in defaults if not loaded))
+        
+        self._rebuild_indexes()
+        self._catalog_changed()
+    
+    async def close(self):
+        """Stop the background flush task and write pending changes"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+    
+    async def flush(self):
+        """Write every collection marked dirty to disk
+        
+        Collections whose save fails stay dirty for the next flush, and the
+        first error is raised.
+        """
+        async with self._flush_lock:
+            self._flush_event.clear()
+            dirty, self._dirty = list(self._dirty), set()
+            results = await asyncio.gather(
+                *(self._savers[name]() for name in dirty), return_exceptions=True
+            )
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                for name, result in zip(dirty, results):
+                    if isinstance(result, BaseException):
+                        self._mark_dirty(name)
+                raise errors[0]
+    
+    def _mark_dirty(self, name: str):
+        """Schedule a collection to be saved by the flush task"""
+        self._dirty.add(name)
+        self._flush_event.set()
+    
+    async def _flush_loop(self):
+        """Coalesce mutations into one save per collection"""
+        while True:
+            await self._flush_event.wait()
+            await asyncio.sleep(self.flush_delay)
+            try:
+                # Shielded so cancelling the loop never abandons a half-done save
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"Error saving data, retrying in {self.retry_delay}s: {e}")
+                await asyncio.sleep(self.retry_delay)
+    
+    def _catalog_changed(self):
+        """Bump the catalogue version and drop results derived from the old one"""
+        self.catalog_version += 1
+        self._filter_cache.clear()
+        self._json_cache.clear()
+    
+    def _rebuild_indexes(self):
+        """Rebuild the category/function/product type lookup indexes"""
+        self._by_category = {}
+        self._by_function = {}
+        self._inci_lower = set()
+        for ingredient in self.ingredients.values():
+            self._index_ingredient(ingredient)
         
-        if not self.peptides:
-            await self._create_default_peptides()
-            
-        if not self.templates:
-            await self._create_default_templates()
-            
-        if not self.regulatory_data:
-            await self._create_regulatory_data()
+        self._templates_by_type = {}
+        for template in self.templates.values():
+            self._templates_by_type.setdefault(template.product_type.value, {})[template.id] = None
+    
+    def _dump_ingredient(self, ingredient: Ingredient) -> Dict[str, Any]:
+        """JSON-mode dump of an ingredient, reused until it changes"""
+        dumped = self._dump_cache.get(ingredient.id)
+        if dumped is None:
+            dumped = self._dump_cache[ingredient.id] = ingredient.model_dump(mode="json")
+        return dumped
+    
+    def _index_ingredient(self, ingredient: Ingredient):
+        """Add a single ingredient to the lookup indexes"""
+        self._by_category.setdefault(ingredient.category, {})[ingredient.id] = None
+        self._by_function.setdefault(ingredient.function.value, {})[ingredient.id] = None
+        self._inci_lower.add(ingredient.inci_name.lower())
     
     async def _load_all_data(self):
         """Load all data from JSON files"""
@@ -64,30 +333,28 @@ class DatabaseManager:
             self._load_templates(),
             self._load_regulatory_data()
         ]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        # Each loader logs and resets its own errors; anything else should surface
+        await asyncio.gather(*tasks)
     
     async def _load_ingredients(self):
         """Load ingredients from JSON file"""
         try:
             if self.ingredients_file.exists():
-                async with aiofiles.open(self.ingredients_file, 'r') as f:
-                    data = json.loads(await f.read())
-                    self.ingredients = {
-                        k: Ingredient(**v) for k, v in data.items()
-                    }
+                self.ingredients, self._dump_cache = await asyncio.to_thread(
+                    _stream_ingredients, self.ingredients_file
+                )
         except Exception as e:
             print(f"Error loading ingredients: {e}")
             self.ingredients = {}
+            self._dump_cache = {}
     
     async def _load_peptides(self):
         """Load peptides from JSON file"""
         try:
             if self.peptides_file.exists():
-                async with aiofiles.open(self.peptides_file, 'r') as f:
-                    data = json.loads(await f.read())
-                    self.peptides = {
-                        k: PeptideData(**v) for k, v in data.items()
-                    }
+                self.peptides = await asyncio.to_thread(
+                    _validate_json_file, PEPTIDE_MAP_ADAPTER, self.peptides_file
+                )
         except Exception as e:
             print(f"Error loading peptides: {e}")
             self.peptides = {}
@@ -96,11 +363,9 @@ class DatabaseManager:
         """Load formulation templates"""
         try:
             if self.formulary_file.exists():
-                async with aiofiles.open(self.formulary_file, 'r') as f:
-                    data = json.loads(await f.read())
-                    self.templates = {
-                        k: FormularyTemplate(**v) for k, v in data.items()
-                    }
+                self.templates = await asyncio.to_thread(
+                    _validate_json_file, TEMPLATE_MAP_ADAPTER, self.formulary_file
+                )
         except Exception as e:
             print(f"Error loading templates: {e}")
             self.templates = {}
@@ -109,234 +374,155 @@ class DatabaseManager:
         """Load regulatory compliance data"""
         try:
             if self.regulatory_file.exists():
-                async with aiofiles.open(self.regulatory_file, 'r') as f:
-                    self.regulatory_data = json.loads(await f.read())
+                self.regulatory_data = await _read_json(self.regulatory_file)
         except Exception as e:
             print(f"Error loading regulatory data: {e}")
             self.regulatory_data = {}
     
     async def _create_default_ingredients(self):
         """Create default ingredient database"""
-        default_ingredients = {
-            "water": Ingredient(
-                id="water",
-                name="Purified Water",
-                inci_name="Aqua",
-                function=IngredientFunction.SOLVENT,
-                category="base",
-                max_concentration=95.0,
-                min_concentration=10.0,
-                cost_per_kg=0.50,
-                natural_origin=True
-            ),
-            "glycerin": Ingredient(
-                id="glycerin",
-                name="Glycerin",
-                inci_name="Glycerin",
-                function=IngredientFunction.MOISTURISER,
-                category="humectant",
-                max_concentration=10.0,
-                min_concentration=0.5,
-                cost_per_kg=2.50,
-                natural_origin=True
-            ),
-            "cetyl_alcohol": Ingredient(
-                id="cetyl_alcohol",
-                name="Cetyl Alcohol",
-                inci_name="Cetyl Alcohol",
-                function=IngredientFunction.EMULSIFIER,
-                category="emulsifier",
-                max_concentration=5.0,
-                min_concentration=0.5,
-                cost_per_kg=4.20,
-                natural_origin=True
-            ),
-            "phenoxyethanol": Ingredient(
-                id="phenoxyethanol",
-                name="Phenoxyethanol",
-                inci_name="Phenoxyethanol",
-                function=IngredientFunction.PRESERVATIVE,
-                category="preservative",
-                max_concentration=1.0,
-                min_concentration=0.1,
-                cost_per_kg=12.50,
-                restricted_in_eu=True
-            ),
-            "hyaluronic_acid": Ingredient(
-                id="hyaluronic_acid",
-                name="Hyaluronic Acid",
-                inci_name="Sodium Hyaluronate",
-                function=IngredientFunction.ACTIVE,
-                category="active",
-                max_concentration=2.0,
-                min_concentration=0.01,
-                cost_per_kg=350.00,
-                natural_origin=True
-            ),
-            "vitamin_c": Ingredient(
-                id="vitamin_c",
-                name="Vitamin C",
-                inci_name="Ascorbic Acid",
-                function=IngredientFunction.ANTIOXIDANT,
-                category="active",
-                max_concentration=20.0,
-                min_concentration=0.1,
-                cost_per_kg=45.00,
-                stability_notes="Light and air sensitive"
-            )
-        }
-        
-        self.ingredients = default_ingredients
+        self.ingredients = dict(get_default_ingredients())
+        self._dump_cache = {}
         await self._save_ingredients()
     
     async def _create_default_peptides(self):
         """Create default peptide database"""
-        default_peptides = {
-            "matrixyl_3000": PeptideData(
-                id="matrixyl_3000",
-                name="Matrixyl 3000",
-                sequence="Pal-GHK + Pal-GQPR",
-                molecular_weight=578.73,
-                function="anti-aging",
-                stability_ph_range={"min": 5.0, "max": 7.0},
-                max_concentration=8.0,
-                cost_per_gram=125.00,
-                efficacy_studies=[
-                    "Reduces wrinkles by 45% in 8 weeks",
-                    "Increases collagen synthesis by 117%"
-                ],
-                safety_assessment_required=True
-            ),
-            "argireline": PeptideData(
-                id="argireline",
-                name="Argireline",
-                sequence="Ac-EEMQRR-NH2",
-                molecular_weight=888.99,
-                function="expression_lines",
-                stability_ph_range={"min": 4.0, "max": 8.0},
-                max_concentration=10.0,
-                cost_per_gram=280.00,
-                efficacy_studies=[
-                    "Reduces expression lines by 17% in 15 days"
-                ],
-                safety_assessment_required=True
-            )
-        }
-        
-        self.peptides = default_peptides
+        self.peptides = dict(get_default_peptides())
         await self._save_peptides()
     
     async def _create_default_templates(self):
         """Create default formulation templates"""
-        default_templates = {
-            "basic_cream": FormularyTemplate(
-                id="basic_cream",
-                name="Basic Moisturizing Cream",
-                product_type=ProductType.CREAM,
-                base_ingredients=[
-                    {"ingredient_id": "water", "concentration": 65.0},
-                    {"ingredient_id": "glycerin", "concentration": 5.0},
-                    {"ingredient_id": "cetyl_alcohol", "concentration": 3.0},
-                    {"ingredient_id": "phenoxyethanol", "concentration": 0.5}
-                ],
-                variable_ingredients=["hyaluronic_acid", "vitamin_c"],
-                instructions="Heat oil and water phases separately to 70°C. Add oil phase to water phase with mixing.",
-                typical_cost_range={"min": 8.50, "max": 25.00}
-            ),
-            "anti_aging_serum": FormularyTemplate(
-                id="anti_aging_serum",
-                name="Anti-Aging Serum",
-                product_type=ProductType.SERUM,
-                base_ingredients=[
-                    {"ingredient_id": "water", "concentration": 80.0},
-                    {"ingredient_id": "glycerin", "concentration": 10.0},
-                    {"ingredient_id": "phenoxyethanol", "concentration": 0.3}
-                ],
-                variable_ingredients=["hyaluronic_acid", "matrixyl_3000", "argireline"],
-                instructions="Mix all ingredients at room temperature. Adjust pH to 6.0-6.5.",
-                typical_cost_range={"min": 35.00, "max": 120.00}
-            )
-        }
-        
-        self.templates = default_templates
+        self.templates = dict(get_default_templates())
         await self._save_templates()
     
     async def _create_regulatory_data(self):
         """Create regulatory compliance database"""
-        self.regulatory_data = {
-            "prohibited_substances": [
-                "hydroquinone",
-                "mercury_compounds",
-                "lead_compounds"
-            ],
-            "restricted_concentrations": {
-                "phenoxyethanol": 1.0,
-                "benzyl_alcohol": 1.0,
-                "salicylic_acid": 2.0
-            },
-            "cpnp_requirements": {
-                "safety_assessment": True,
-                "product_information_file": True,
-                "responsible_person": True
-            },
-            "labeling_requirements": [
-                "INCI names in descending order",
-                "Warnings and precautions",
-                "Batch number and expiry date",
-                "Net content",
-                "Function of product"
-            ]
-        }
+        self.regulatory_data = dict(get_default_regulatory_data())
         await self._save_regulatory_data()
     
+    def get_ingredient_columns(self) -> IngredientColumns:
+        """Get the column snapshot of the catalogue, building it if stale"""
+        if self._columns is None or self._columns.version != self.catalog_version:
+            self._columns = IngredientColumns(self.ingredients, self.catalog_version)
+        return self._columns
+    
     async def get_ingredients(
         self, 
         category: Optional[str] = None,
         function: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        max_cost_per_kg: Optional[float] = None
     ) -> List[Ingredient]:
-        """Get ingredients with optional filtering"""
-        ingredients = list(self.ingredients.values())
+        """Get ingredients with optional filtering
+        
+        Results are shared between callers with the same filters; don't mutate them.
+        """
+        key = (category, function, limit, max_cost_per_kg)
+        hit = self._filter_cache.get(key)
+        if hit is not None:
+            return hit
+        
+        if function:
+            # Normalise enum members and raw strings once to the index key
+            member = INGREDIENT_FUNCTION_LOOKUP.get(function)
+            if member is None:
+                return []
+            function = member.value
+        
+        ids: Dict[str, Any] = self.ingredients
         
         if category:
-            ingredients = [i for i in ingredients if i.category == category]
+            ids = self._by_category.get(category, {})
         
         if function:
-            ingredients = [i for i in ingredients if i.function == function]
+            ids = _intersect(ids, self._by_function.get(function, {}))
+        
+        if max_cost_per_kg is not None:
+            columns = self.get_ingredient_columns()
+            affordable = columns.ids[columns.cost_per_kg <= max_cost_per_kg]
+            ids = _intersect(ids, dict.fromkeys(affordable))
         
-        return ingredients[:limit]
+        ingredients = [self.ingredients[i] for i in itertools.islice(ids, limit)]
+        self._filter_cache.put(key, ingredients)
+        return ingredients
+    
+    async def get_ingredients_json(
+        self,
+        category: Optional[str] = None,
+        function: Optional[str] = None,
+        limit: int = 100,
+        max_cost_per_kg: Optional[float] = None
+    ) -> bytes:
+        """Get filtered ingredients as pre-serialized JSON"""
+        key = ("ingredients", category, function, limit, max_cost_per_kg)
+        payload = self._json_cache.get(key)
+        if payload is None:
+            ingredients = await self.get_ingredients(category, function, limit, max_cost_per_kg)
+            payload = orjson.dumps([self._dump_ingredient(i) for i in ingredients])
+            self._json_cache.put(key, payload)
+        return payload
     
     async def get_ingredient_by_id(self, ingredient_id: str) -> Optional[Ingredient]:
         """Get specific ingredient by ID"""
         return self.ingredients.get(ingredient_id)
     
+    async def get_ingredients_by_ids(self, ingredient_ids: Iterable[str]) -> Dict[str, Ingredient]:
+        """Get several ingredients in one call, keyed by ID (unknown IDs are skipped)"""
+        return {i: self.ingredients[i] for i in ingredient_ids if i in self.ingredients}
+    
     async def add_ingredient(self, ingredient_data: IngredientAdd) -> str:
         """Add new ingredient to database"""
-        ingredient_id = str(uuid.uuid4())
+        ids = await self.add_ingredients_bulk([ingredient_data])
+        return ids[0]
+    
+    async def add_ingredients_bulk(self, items: List[IngredientAdd]) -> List[str]:
+        """Add several ingredients with one validation pass and one save"""
+        if not items:
+            return []
         
-        # Check if ingredient already exists
-        existing = [i for i in self.ingredients.values() 
-                   if i.inci_name.lower() == ingredient_data.inci_name.lower()]
-        if existing:
-            raise ValueError(f"Ingredient {ingredient_data.inci_name} already exists")
+        # Check the whole batch (against the database and itself) before any change
+        batch_inci: Set[str] = set()
+        for item in items:
+            inci_lower = item.inci_name.lower()
+            if inci_lower in self._inci_lower or inci_lower in batch_inci:
+                raise ValueError(f"Ingredient {item.inci_name} already exists")
+            batch_inci.add(inci_lower)
         
-        ingredient = Ingredient(
-            id=ingredient_id,
-            **ingredient_data.model_dump()
-        )
+        ingredients = INGREDIENT_LIST_ADAPTER.validate_python([
+            {"id": str(uuid.uuid4()), **item.model_dump()}
+            for item in items
+        ])
         
-        self.ingredients[ingredient_id] = ingredient
-        await self._save_ingredients()
-        return ingredient_id
+        for ingredient in ingredients:
+            self.ingredients[ingredient.id] = ingredient
+            self._index_ingredient(ingredient)
+            self._dump_cache.pop(ingredient.id, None)
+        
+        self._catalog_changed()
+        self._mark_dirty("ingredients")
+        return [i.id for i in ingredients]
     
     async def get_templates(self, product_type: Optional[str] = None) -> List[FormularyTemplate]:
         """Get formulation templates"""
-        templates = list(self.templates.values())
+        if not product_type:
+            return list(self.templates.values())
         
-        if product_type:
-            templates = [t for t in templates if t.product_type == product_type]
+        member = PRODUCT_TYPE_LOOKUP.get(product_type)
+        if member is None:
+            return []
+        product_type = member.value
         
-        return templates
+        return [self.templates[i] for i in self._templates_by_type.get(product_type, {})]
+    
+    async def get_templates_json(self, product_type: Optional[str] = None) -> bytes:
+        """Get formulation templates as pre-serialized JSON"""
+        key = ("templates", product_type)
+        payload = self._json_cache.get(key)
+        if payload is None:
+            templates = await self.get_templates(product_type)
+            payload = TEMPLATE_LIST_ADAPTER.dump_json(templates)
+            self._json_cache.put(key, payload)
+        return payload
     
     async def get_peptides(self) -> List[PeptideData]:
         """Get all peptides"""
@@ -349,24 +535,20 @@ class DatabaseManager:
     # Save methods
     async def _save_ingredients(self):
         """Save ingredients to JSON file"""
-        data = {k: v.model_dump() for k, v in self.ingredients.items()}
-        async with aiofiles.open(self.ingredients_file, 'w') as f:
-            await f.write(json.dumps(data, indent=2, default=str))
+        data = {k: self._dump_ingredient(v) for k, v in self.ingredients.items()}
+        await _write_json(self.ingredients_file, data)
     
     async def _save_peptides(self):
         """Save peptides to JSON file"""
-        data = {k: v.model_dump() for k, v in self.peptides.items()}
-        async with aiofiles.open(self.peptides_file, 'w') as f:
-            await f.write(json.dumps(data, indent=2, default=str))
+        data = {k: v.model_dump(mode="json") for k, v in self.peptides.items()}
+        await _write_json(self.peptides_file, data)
     
     async def _save_templates(self):
         """Save templates to JSON file"""
-        data = {k: v.model_dump() for k, v in self.templates.items()}
-        async with aiofiles.open(self.formulary_file, 'w') as f:
-            await f.write(json.dumps(data, indent=2, default=str))
+        data = {k: v.model_dump(mode="json") for k, v in self.templates.items()}
+        await _write_json(self.formulary_file, data)
     
     async def _save_regulatory_data(self):
         """Save regulatory data to JSON file"""
-        async with aiofiles.open(self.regulatory_file, 'w') as f:
-            await f.write(json.dumps(self.regulatory_data, indent=2, default=str))
+        await _write_json(self.regulatory_file, self.regulatory_data)
 
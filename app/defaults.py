@@ -0,0 +1,192 @@
+"""
+Default Data for Cosmetic Formulation AI Agent
+Seed ingredients, peptides, templates and regulatory data
+defaults.py
+Labrugis Ltd. 2025
+"""
+
+from functools import lru_cache
+from typing import Dict, Any
+
+from models import (
+    Ingredient,
+    FormularyTemplate,
+    PeptideData,
+    IngredientFunction,
+    ProductType
+)
+
+
+# Each builder validates its models once per process; callers must copy the
+# returned dict before mutating it.
+
+@lru_cache(maxsize=None)
+def get_default_ingredients() -> Dict[str, Ingredient]:
+    """Default ingredient database"""
+    return {
+        "water": Ingredient(
+            id="water",
+            name="Purified Water",
+            inci_name="Aqua",
+            function=IngredientFunction.SOLVENT,
+            category="base",
+            max_concentration=95.0,
+            min_concentration=10.0,
+            cost_per_kg=0.50,
+            natural_origin=True
+        ),
+        "glycerin": Ingredient(
+            id="glycerin",
+            name="Glycerin",
+            inci_name="Glycerin",
+            function=IngredientFunction.MOISTURISER,
+            category="humectant",
+            max_concentration=10.0,
+            min_concentration=0.5,
+            cost_per_kg=2.50,
+            natural_origin=True
+        ),
+        "cetyl_alcohol": Ingredient(
+            id="cetyl_alcohol",
+            name="Cetyl Alcohol",
+            inci_name="Cetyl Alcohol",
+            function=IngredientFunction.EMULSIFIER,
+            category="emulsifier",
+            max_concentration=5.0,
+            min_concentration=0.5,
+            cost_per_kg=4.20,
+            natural_origin=True
+        ),
+        "phenoxyethanol": Ingredient(
+            id="phenoxyethanol",
+            name="Phenoxyethanol",
+            inci_name="Phenoxyethanol",
+            function=IngredientFunction.PRESERVATIVE,
+            category="preservative",
+            max_concentration=1.0,
+            min_concentration=0.1,
+            cost_per_kg=12.50,
+            restricted_in_eu=True
+        ),
+        "hyaluronic_acid": Ingredient(
+            id="hyaluronic_acid",
+            name="Hyaluronic Acid",
+            inci_name="Sodium Hyaluronate",
+            function=IngredientFunction.ACTIVE,
+            category="active",
+            max_concentration=2.0,
+            min_concentration=0.01,
+            cost_per_kg=350.00,
+            natural_origin=True
+        ),
+        "vitamin_c": Ingredient(
+            id="vitamin_c",
+            name="Vitamin C",
+            inci_name="Ascorbic Acid",
+            function=IngredientFunction.ANTIOXIDANT,
+            category="active",
+            max_concentration=20.0,
+            min_concentration=0.1,
+            cost_per_kg=45.00,
+            stability_notes="Light and air sensitive"
+        )
+    }
+
+
+@lru_cache(maxsize=None)
+def get_default_peptides() -> Dict[str, PeptideData]:
+    """Default peptide database"""
+    return {
+        "matrixyl_3000": PeptideData(
+            id="matrixyl_3000",
+            name="Matrixyl 3000",
+            sequence="Pal-GHK + Pal-GQPR",
+            molecular_weight=578.73,
+            function="anti-aging",
+            stability_ph_range={"min": 5.0, "max": 7.0},
+            max_concentration=8.0,
+            cost_per_gram=125.00,
+            efficacy_studies=[
+                "Reduces wrinkles by 45% in 8 weeks",
+                "Increases collagen synthesis by 117%"
+            ],
+            safety_assessment_required=True
+        ),
+        "argireline": PeptideData(
+            id="argireline",
+            name="Argireline",
+            sequence="Ac-EEMQRR-NH2",
+            molecular_weight=888.99,
+            function="expression_lines",
+            stability_ph_range={"min": 4.0, "max": 8.0},
+            max_concentration=10.0,
+            cost_per_gram=280.00,
+            efficacy_studies=[
+                "Reduces expression lines by 17% in 15 days"
+            ],
+            safety_assessment_required=True
+        )
+    }
+
+
+@lru_cache(maxsize=None)
+def get_default_templates() -> Dict[str, FormularyTemplate]:
+    """Default formulation templates"""
+    return {
+        "basic_cream": FormularyTemplate(
+            id="basic_cream",
+            name="Basic Moisturizing Cream",
+            product_type=ProductType.CREAM,
+            base_ingredients=[
+                {"ingredient_id": "water", "concentration": 65.0},
+                {"ingredient_id": "glycerin", "concentration": 5.0},
+                {"ingredient_id": "cetyl_alcohol", "concentration": 3.0},
+                {"ingredient_id": "phenoxyethanol", "concentration": 0.5}
+            ],
+            variable_ingredients=["hyaluronic_acid", "vitamin_c"],
+            instructions="Heat oil and water phases separately to 70°C. Add oil phase to water phase with mixing.",
+            typical_cost_range={"min": 8.50, "max": 25.00}
+        ),
+        "anti_aging_serum": FormularyTemplate(
+            id="anti_aging_serum",
+            name="Anti-Aging Serum",
+            product_type=ProductType.SERUM,
+            base_ingredients=[
+                {"ingredient_id": "water", "concentration": 80.0},
+                {"ingredient_id": "glycerin", "concentration": 10.0},
+                {"ingredient_id": "phenoxyethanol", "concentration": 0.3}
+            ],
+            variable_ingredients=["hyaluronic_acid", "matrixyl_3000", "argireline"],
+            instructions="Mix all ingredients at room temperature. Adjust pH to 6.0-6.5.",
+            typical_cost_range={"min": 35.00, "max": 120.00}
+        )
+    }
+
+
+@lru_cache(maxsize=None)
+def get_default_regulatory_data() -> Dict[str, Any]:
+    """Default regulatory compliance database"""
+    return {
+        "prohibited_substances": [
+            "hydroquinone",
+            "mercury_compounds",
+            "lead_compounds"
+        ],
+        "restricted_concentrations": {
+            "phenoxyethanol": 1.0,
+            "benzyl_alcohol": 1.0,
+            "salicylic_acid": 2.0
+        },
+        "cpnp_requirements": {
+            "safety_assessment": True,
+            "product_information_file": True,
+            "responsible_person": True
+        },
+        "labeling_requirements": [
+            "INCI names in descending order",
+            "Warnings and precautions",
+            "Batch number and expiry date",
+            "Net content",
+            "Function of product"
+        ]
+    }
@@ -4,13 +4,14 @@ logic.py
 Labrugis Ltd. 2025
 """
 
-import uuid
+import secrets
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple, Final
 from datetime import datetime
 import asyncio
 
 from models import (
+    Ingredient,
     FormulationRequest,
     FormulationResponse,
     FormulationIngredient,
@@ -21,7 +22,139 @@ from models import (
     ProductType,
     IngredientFunction
 )
-from database import DatabaseManager
+from database import (
+    DatabaseManager,
+    IngredientColumns,
+    FUNCTION_CODES,
+    TOKEN_PEPTIDE,
+    TOKEN_RETINOL,
+    TOKEN_VITC
+)
+
+
+class _Ing(NamedTuple):
+    """Formulation row used inside the engine; validated once as FormulationIngredient"""
+    ingredient_id: str
+    name: str
+    inci_name: str
+    concentration: float
+    function: IngredientFunction
+    
+    @classmethod
+    def of(cls, ingredient: Ingredient, concentration: float) -> "_Ing":
+        return cls(ingredient.id, ingredient.name, ingredient.inci_name, concentration, ingredient.function)
+
+
+# Base score per ingredient function, as a table indexed by FUNCTION_CODES
+_FUNCTION_PRIORITIES = {
+    IngredientFunction.ACTIVE: 10.0,
+    IngredientFunction.MOISTURISER: 8.0,
+    IngredientFunction.ANTIOXIDANT: 6.0,
+    IngredientFunction.THICKENER: 4.0,
+    IngredientFunction.FRAGRANCE: 2.0
+}
+_FUNCTION_PRIORITY = np.array([_FUNCTION_PRIORITIES.get(f, 1.0) for f in FUNCTION_CODES])
+
+# Simplified pH contribution per ingredient
+_PH_CONTRIBUTORS = {
+    "water": 7.0,
+    "glycerin": 7.0,
+    "vitamin_c": 3.5,
+    "hyaluronic_acid": 6.5,
+    "phenoxyethanol": 6.0
+}
+
+# Stability bonus for each function present
+_STABILITY_BONUSES = {
+    IngredientFunction.EMULSIFIER: 1.0,
+    IngredientFunction.PRESERVATIVE: 1.5,
+    IngredientFunction.ANTIOXIDANT: 0.5
+}
+
+# Manufacturing instructions per product type
+_BASE_INSTRUCTIONS: Dict[ProductType, str] = {
+    ProductType.CREAM: (
+        "1. Heat water phase ingredients to 70°C\n"
+        "2. Heat oil phase ingredients to 70°C\n"
+        "3. Slowly add oil phase to water phase with continuous mixing\n"
+        "4. Cool to 40°C while mixing\n"
+        "5. Add heat-sensitive actives below 40°C\n"
+        "6. Adjust pH if needed\n"
+        "7. Fill into sterilized containers"
+    ),
+    ProductType.SERUM: (
+        "1. Mix water and glycols at room temperature\n"
+        "2. Add water-soluble actives one by one\n"
+        "3. Mix until completely dissolved\n"
+        "4. Add preservative system\n"
+        "5. Adjust pH to 5.5-6.5\n"
+        "6. Fill into sterilized containers"
+    ),
+    ProductType.LOTION: (
+        "1. Heat water phase to 65°C\n"
+        "2. Heat oil phase to 65°C\n"
+        "3. Add oil phase to water phase with mixing\n"
+        "4. Cool to room temperature\n"
+        "5. Add actives and preservatives\n"
+        "6. Adjust pH and viscosity\n"
+        "7. Fill into containers"
+    )
+}
+
+
+# Formulation rules and constraints
+_PRODUCT_TYPE_RULES: Final = {
+    ProductType.CREAM: {
+        "water_range": (40, 80),
+        "oil_range": (10, 30),
+        "emulsifier_range": (2, 8),
+        "preservative_range": (0.1, 1.0),
+        "required_functions": frozenset({IngredientFunction.EMULSIFIER, IngredientFunction.PRESERVATIVE})
+    },
+    ProductType.SERUM: {
+        "water_range": (70, 95),
+        "oil_range": (0, 10),
+        "active_range": (1, 20),
+        "preservative_range": (0.1, 1.0),
+        "required_functions": frozenset({IngredientFunction.PRESERVATIVE})
+    },
+    ProductType.LOTION: {
+        "water_range": (60, 85),
+        "oil_range": (5, 25),
+        "emulsifier_range": (1, 5),
+        "preservative_range": (0.1, 1.0),
+        "required_functions": frozenset({IngredientFunction.EMULSIFIER, IngredientFunction.PRESERVATIVE})
+    }
+}
+
+# Compatibility matrix for ingredient interactions
+_COMPATIBILITY_MATRIX: Final = {
+    "vitamin_c": {"incompatible": frozenset({"niacinamide"}), "synergistic": frozenset({"vitamin_e"})},
+    "retinol": {"incompatible": frozenset({"vitamin_c", "aha_bha"}), "synergistic": frozenset({"hyaluronic_acid"})},
+    "niacinamide": {"incompatible": frozenset({"vitamin_c"}), "synergistic": frozenset({"hyaluronic_acid"})}
+}
+
+# Compatibility as bitmasks: one bit per ingredient named in the matrix
+_ID_BIT: Final[Dict[str, int]] = {
+    ingredient_id: 1 << bit
+    for bit, ingredient_id in enumerate(sorted(
+        set(_COMPATIBILITY_MATRIX).union(*(c["incompatible"] for c in _COMPATIBILITY_MATRIX.values()))
+    ))
+}
+
+
+def _id_mask(ingredient_ids) -> int:
+    """OR together the compatibility bits of the given ingredients"""
+    mask = 0
+    for ingredient_id in ingredient_ids:
+        mask |= _ID_BIT.get(ingredient_id, 0)
+    return mask
+
+
+_INCOMPAT_MASK: Final[Dict[str, int]] = {
+    ingredient_id: _id_mask(compatibility["incompatible"])
+    for ingredient_id, compatibility in _COMPATIBILITY_MATRIX.items()
+}
 
 
 class FormulationEngine:
@@ -30,37 +163,9 @@ class FormulationEngine:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         
-        # Formulation rules and constraints
-        self.product_type_rules = {
-            ProductType.CREAM: {
-                "water_range": (40, 80),
-                "oil_range": (10, 30),
-                "emulsifier_range": (2, 8),
-                "preservative_range": (0.1, 1.0),
-                "required_functions": [IngredientFunction.EMULSIFIER, IngredientFunction.PRESERVATIVE]
-            },
-            ProductType.SERUM: {
-                "water_range": (70, 95),
-                "oil_range": (0, 10),
-                "active_range": (1, 20),
-                "preservative_range": (0.1, 1.0),
-                "required_functions": [IngredientFunction.PRESERVATIVE]
-            },
-            ProductType.LOTION: {
-                "water_range": (60, 85),
-                "oil_range": (5, 25),
-                "emulsifier_range": (1, 5),
-                "preservative_range": (0.1, 1.0),
-                "required_functions": [IngredientFunction.EMULSIFIER, IngredientFunction.PRESERVATIVE]
-            }
-        }
-        
-        # Compatibility matrix for ingredient interactions
-        self.compatibility_matrix = {
-            "vitamin_c": {"incompatible": ["niacinamide"], "synergistic": ["vitamin_e"]},
-            "retinol": {"incompatible": ["vitamin_c", "aha_bha"], "synergistic": ["hyaluronic_acid"]},
-            "niacinamide": {"incompatible": ["vitamin_c"], "synergistic": ["hyaluronic_acid"]}
-        }
+        # Request-independent scoring arrays, rebuilt when the catalogue version changes
+        self._cached_version: Optional[int] = None
+        self._cached_catalog_arrays: Dict[str, np.ndarray] = {}
     
     async def generate_formulation(self, request: FormulationRequest) -> FormulationResponse:
         """Generate optimized cosmetic formulation"""
@@ -73,78 +178,81 @@ class FormulationEngine:
         formulation = []
         total_percentage = 0.0
         
+        # Fetch every ingredient the template and request name in one call
+        base_ingredients = base_template.base_ingredients if base_template else []
+        lookup = await self.db.get_ingredients_by_ids(
+            [b.ingredient_id for b in base_ingredients] + request.required_ingredients
+        )
+        
         # Step 1: Add base ingredients from template
         if base_template:
             for base_ing in base_template.base_ingredients:
-                ingredient = await self.db.get_ingredient_by_id(base_ing["ingredient_id"])
+                ingredient = lookup.get(base_ing.ingredient_id)
                 if ingredient:
-                    conc = base_ing["concentration"]
-                    formulation.append(FormulationIngredient(
-                        ingredient_id=ingredient.id,
-                        name=ingredient.name,
-                        inci_name=ingredient.inci_name,
-                        concentration=conc,
-                        function=ingredient.function
-                    ))
+                    conc = base_ing.concentration
+                    formulation.append(_Ing.of(ingredient, conc))
                     total_percentage += conc
+        included_ids = {f.ingredient_id for f in formulation}
         
         # Step 2: Add required ingredients
         for req_ing_id in request.required_ingredients:
-            if not any(f.ingredient_id == req_ing_id for f in formulation):
-                ingredient = await self.db.get_ingredient_by_id(req_ing_id)
+            if req_ing_id not in included_ids:
+                ingredient = lookup.get(req_ing_id)
                 if ingredient:
                     # Calculate optimal concentration
-                    conc = await self._calculate_optimal_concentration(
+                    conc = self._calculate_optimal_concentration(
                         ingredient, request, total_percentage
                     )
                     if conc > 0:
-                        formulation.append(FormulationIngredient(
-                            ingredient_id=ingredient.id,
-                            name=ingredient.name,
-                            inci_name=ingredient.inci_name,
-                            concentration=conc,
-                            function=ingredient.function
-                        ))
+                        formulation.append(_Ing.of(ingredient, conc))
+                        included_ids.add(ingredient.id)
                         total_percentage += conc
         
         # Step 3: Add complementary ingredients based on target properties
         if total_percentage < 99.0:
-            complementary_ings = await self._select_complementary_ingredients(
-                request, formulation, 99.0 - total_percentage
+            complementary_ings, added_percentage = await self._select_complementary_ingredients(
+                request, formulation, included_ids, 99.0 - total_percentage
             )
             formulation.extend(complementary_ings)
-            total_percentage = sum(f.concentration for f in formulation)
+            included_ids.update(f.ingredient_id for f in complementary_ings)
+            total_percentage += added_percentage
         
-        # Step 4: Normalize to 100%
-        if total_percentage != 100.0:
+        # Step 4: Normalize to 100% (unless already there to within rounding)
+        if abs(total_percentage - 100.0) > 0.01:
             formulation = self._normalize_formulation(formulation)
-            total_percentage = 100.0
+        total_percentage = 100.0
+        
+        # Complementary picks come from the catalogue; add them to the lookup
+        lookup.update(await self.db.get_ingredients_by_ids(
+            f.ingredient_id for f in formulation if f.ingredient_id not in lookup
+        ))
         
         # Step 5: Validate and optimize
-        formulation = await self._validate_formulation(formulation, request)
+        formulation = await self._validate_formulation(formulation, request, lookup)
         
-        # Calculate properties
-        cost = await self._calculate_cost(formulation)
-        ph = await self._predict_ph(formulation)
-        stability = await self._predict_stability(formulation)
+        # Calculate properties (pure CPU work on the rows in hand)
+        cost = self._calculate_cost(formulation, lookup)
+        ph = self._predict_ph(formulation)
+        stability = self._predict_stability(formulation)
+        instructions = self._generate_instructions(formulation, request.product_type)
         
-        # Generate response
-        response = FormulationResponse(
-            id=str(uuid.uuid4()),
+        # Generate response (every value was produced or checked above)
+        response = FormulationResponse.from_trusted(dict(
+            id=secrets.token_hex(16),
             product_type=request.product_type,
-            ingredients=formulation,
+            ingredients=[FormulationIngredient.from_trusted(f._asdict()) for f in formulation],
             total_percentage=total_percentage,
             estimated_cost_per_kg=cost,
             predicted_ph=ph,
             stability_score=stability,
             compliance_status=ComplianceStatus.COMPLIANT,
-            instructions=await self._generate_instructions(formulation, request.product_type),
+            instructions=instructions,
             shelf_life_estimate=24
-        )
+        ))
         
         return response
     
-    async def _calculate_optimal_concentration(
+    def _calculate_optimal_concentration(
         self, 
         ingredient, 
         request: FormulationRequest, 
@@ -187,106 +295,120 @@ class FormulationEngine:
     async def _select_complementary_ingredients(
         self,
         request: FormulationRequest,
-        current_formulation: List[FormulationIngredient],
+        current_formulation: List[_Ing],
+        included_ids: set,
         remaining_percentage: float
-    ) -> List[FormulationIngredient]:
-        """Select complementary ingredients based on target properties"""
+    ) -> Tuple[List[_Ing], float]:
+        """Select complementary ingredients based on target properties
+        
+        Returns the picks and the percentage they add up to.
+        """
         
         complementary = []
         used_functions = {f.function for f in current_formulation}
         
-        # Get all available ingredients
-        all_ingredients = await self.db.get_ingredients()
-        
-        # Filter out excluded ingredients
-        available = [
-            ing for ing in all_ingredients 
-            if ing.id not in request.excluded_ingredients
-            and ing.id not in [f.ingredient_id for f in current_formulation]
-        ]
-        
-        # Priority scoring based on target properties
-        scored_ingredients = []
-        for ingredient in available:
-            score = await self._score_ingredient_for_request(ingredient, request, used_functions)
-            if score > 0:
-                scored_ingredients.append((ingredient, score))
-        
-        # Sort by score
-        scored_ingredients.sort(key=lambda x: x[1], reverse=True)
+        # Score the whole catalogue in one vectorised pass
+        columns, arrays = self._get_catalog_arrays()
+        scores = self._score_all(columns, arrays, request, used_functions)
+        
+        # Filter out excluded and already included ingredients
+        available = np.ones(len(columns.items), dtype=bool)
+        skip_ids = included_ids.union(request.excluded_ingredients)
+        available[[columns.rows[i] for i in skip_ids if i in columns.rows]] = False
+        candidates = np.flatnonzero(available)
+        candidate_scores = scores[candidates]
+        
+        # The greedy fill rarely gets past the first few picks, so rank the top k
+        # first (k >= 8, and enough 0.5% picks to fill the remaining percentage)
+        # and only sort the rest if the fill runs past them. Ties at the cut go
+        # to catalogue order, so the two batches match one full stable sort
+        batches = [(candidates, candidate_scores)]
+        k = max(8, int(remaining_percentage / 0.5))
+        if len(candidates) > k:
+            kth = -np.partition(-candidate_scores, k - 1)[k - 1]
+            top = candidate_scores > kth
+            ties = np.flatnonzero(candidate_scores == kth)[:k - np.count_nonzero(top)]
+            top[ties] = True
+            batches = [
+                (candidates[top], candidate_scores[top]),
+                (candidates[~top], candidate_scores[~top])
+            ]
         
         # Select top ingredients within remaining percentage
         current_remaining = remaining_percentage
-        for ingredient, score in scored_ingredients:
+        for batch, batch_scores in batches:
             if current_remaining <= 0.1:
                 break
-                
-            conc = await self._calculate_optimal_concentration(
-                ingredient, request, 100.0 - current_remaining
-            )
+        
+            # Highest score first; ties keep catalogue order
+            for row in batch[np.argsort(-batch_scores, kind="stable")]:
+                if current_remaining <= 0.1:
+                    break
             
-            if conc > 0 and conc <= current_remaining:
-                complementary.append(FormulationIngredient(
-                    ingredient_id=ingredient.id,
-                    name=ingredient.name,
-                    inci_name=ingredient.inci_name,
-                    concentration=conc,
-                    function=ingredient.function
-                ))
-                current_remaining -= conc
-                used_functions.add(ingredient.function)
+                ingredient = columns.items[row]
+                conc = self._calculate_optimal_concentration(
+                    ingredient, request, 100.0 - current_remaining
+                )
+            
+                if conc > 0 and conc <= current_remaining:
+                    complementary.append(_Ing.of(ingredient, conc))
+                    current_remaining -= conc
         
-        return complementary
+        return complementary, remaining_percentage - current_remaining
+    
+    def _get_catalog_arrays(self) -> Tuple[IngredientColumns, Dict[str, np.ndarray]]:
+        """Get the catalogue snapshot and the engine's arrays derived from it"""
+        columns = self.db.get_ingredient_columns()
+        if columns.version != self._cached_version:
+            is_active = columns.function_code == FUNCTION_CODES[IngredientFunction.ACTIVE]
+            self._cached_catalog_arrays = {
+                "priority": _FUNCTION_PRIORITY[columns.function_code],
+                "anti_aging": is_active & ((columns.token_bits & (TOKEN_PEPTIDE | TOKEN_RETINOL)) != 0),
+                "moisturiser": columns.function_code == FUNCTION_CODES[IngredientFunction.MOISTURISER]
+            }
+            self._cached_version = columns.version
+        return columns, self._cached_catalog_arrays
     
-    async def _score_ingredient_for_request(
+    def _score_all(
         self,
-        ingredient,
+        columns: IngredientColumns,
+        arrays: Dict[str, np.ndarray],
         request: FormulationRequest,
         used_functions: set
-    ) -> float:
-        """Score ingredient based on how well it fits the request"""
-        score = 0.0
+    ) -> np.ndarray:
+        """Score every catalogue ingredient for how well it fits the request"""
         
         # Function priority scoring
-        function_priorities = {
-            IngredientFunction.ACTIVE: 10.0,
-            IngredientFunction.MOISTURIZER: 8.0,
-            IngredientFunction.ANTIOXIDANT: 6.0,
-            IngredientFunction.THICKENER: 4.0,
-            IngredientFunction.FRAGRANCE: 2.0
-        }
-        
-        base_score = function_priorities.get(ingredient.function, 1.0)
+        scores = arrays["priority"]
         
         # Boost score if function not yet used
-        if ingredient.function not in used_functions:
-            base_score *= 1.5
+        used = np.zeros(len(FUNCTION_CODES), dtype=bool)
+        used[[FUNCTION_CODES[f] for f in used_functions]] = True
+        scores = scores * np.where(used[columns.function_code], 1.0, 1.5)
         
         # Natural preference bonus
-        if request.natural_preference and ingredient.natural_origin:
-            base_score *= 1.3
+        if request.natural_preference:
+            scores *= np.where(columns.natural_origin, 1.3, 1.0)
         
-        # Cost consideration
-        if request.max_cost_per_kg and ingredient.cost_per_kg:
-            if ingredient.cost_per_kg > request.max_cost_per_kg * 0.1:  # High cost ingredient
-                base_score *= 0.7
+        # Cost consideration (NaN costs compare False, i.e. unknown cost isn't penalised)
+        if request.max_cost_per_kg:
+            scores *= np.where(columns.cost_per_kg > request.max_cost_per_kg * 0.1, 0.7, 1.0)
         
         # Target properties matching
         target_props = request.target_properties
         
-        if "anti_aging" in target_props and ingredient.function == IngredientFunction.ACTIVE:
-            if "peptide" in ingredient.name.lower() or "retinol" in ingredient.name.lower():
-                base_score *= 1.5
+        if "anti_aging" in target_props:
+            scores *= np.where(arrays["anti_aging"], 1.5, 1.0)
         
-        if "moisturizing" in target_props and ingredient.function == IngredientFunction.MOISTURIZER:
-            base_score *= 1.4
+        if "moisturizing" in target_props:
+            scores *= np.where(arrays["moisturiser"], 1.4, 1.0)
         
-        if "brightening" in target_props and "vitamin_c" in ingredient.id:
-            base_score *= 1.4
+        if "brightening" in target_props:
+            scores *= np.where((columns.token_bits & TOKEN_VITC) != 0, 1.4, 1.0)
         
-        return base_score
+        return scores
     
-    def _normalize_formulation(self, formulation: List[FormulationIngredient]) -> List[FormulationIngredient]:
+    def _normalize_formulation(self, formulation: List[_Ing]) -> List[_Ing]:
         """Normalize formulation to sum to 100%"""
         total = sum(f.concentration for f in formulation)
         
@@ -296,27 +418,23 @@ class FormulationEngine:
         normalized = []
         for ingredient in formulation:
             new_conc = (ingredient.concentration / total) * 100.0
-            normalized.append(FormulationIngredient(
-                ingredient_id=ingredient.ingredient_id,
-                name=ingredient.name,
-                inci_name=ingredient.inci_name,
-                concentration=round(new_conc, 2),
-                function=ingredient.function
-            ))
+            normalized.append(ingredient._replace(concentration=round(new_conc, 2)))
         
         return normalized
     
     async def _validate_formulation(
         self, 
-        formulation: List[FormulationIngredient], 
-        request: FormulationRequest
-    ) -> List[FormulationIngredient]:
+        formulation: List[_Ing], 
+        request: FormulationRequest,
+        lookup: Dict[str, Ingredient]
+    ) -> List[_Ing]:
         """Validate and adjust formulation for safety and efficacy"""
         
         validated = []
+        formulation_mask = _id_mask(f.ingredient_id for f in formulation)
         
         for ingredient in formulation:
-            db_ingredient = await self.db.get_ingredient_by_id(ingredient.ingredient_id)
+            db_ingredient = lookup.get(ingredient.ingredient_id)
             if not db_ingredient:
                 continue
             
@@ -328,66 +446,39 @@ class FormulationEngine:
                 conc = max(conc, db_ingredient.min_concentration)
             
             # Check compatibility
-            if await self._check_ingredient_compatibility(ingredient.ingredient_id, formulation):
-                validated.append(FormulationIngredient(
-                    ingredient_id=ingredient.ingredient_id,
-                    name=ingredient.name,
-                    inci_name=ingredient.inci_name,
-                    concentration=conc,
-                    function=ingredient.function
-                ))
+            if self._check_ingredient_compatibility(ingredient.ingredient_id, formulation_mask):
+                validated.append(ingredient._replace(concentration=conc))
         
         return validated
     
-    async def _check_ingredient_compatibility(
-        self, 
-        ingredient_id: str, 
-        formulation: List[FormulationIngredient]
-    ) -> bool:
+    def _check_ingredient_compatibility(self, ingredient_id: str, formulation_mask: int) -> bool:
         """Check if ingredient is compatible with other ingredients"""
-        
-        if ingredient_id not in self.compatibility_matrix:
-            return True
-        
-        compatibility = self.compatibility_matrix[ingredient_id]
-        formulation_ids = [f.ingredient_id for f in formulation]
-        
-        # Check for incompatible ingredients
-        for incompatible in compatibility.get("incompatible", []):
-            if incompatible in formulation_ids:
-                return False
-        
-        return True
+        return (formulation_mask & _INCOMPAT_MASK.get(ingredient_id, 0)) == 0
     
-    async def _calculate_cost(self, formulation: List[FormulationIngredient]) -> Optional[float]:
+    def _calculate_cost(
+        self,
+        formulation: List[_Ing],
+        lookup: Dict[str, Ingredient]
+    ) -> Optional[float]:
         """Calculate estimated cost per kg"""
         total_cost = 0.0
         
         for ingredient in formulation:
-            db_ingredient = await self.db.get_ingredient_by_id(ingredient.ingredient_id)
+            db_ingredient = lookup.get(ingredient.ingredient_id)
             if db_ingredient and db_ingredient.cost_per_kg:
-                ingredient_cost = (ingredient.concentration / 100.0) * db_ingredient.cost_per_kg
-                total_cost += ingredient_cost
+                total_cost += (ingredient.concentration / 100.0) * db_ingredient.cost_per_kg
         
         return round(total_cost, 2) if total_cost > 0 else None
     
-    async def _predict_ph(self, formulation: List[FormulationIngredient]) -> Optional[float]:
+    def _predict_ph(self, formulation: List[_Ing]) -> Optional[float]:
         """Predict formulation pH"""
         # Simplified pH prediction based on ingredients
-        ph_contributors = {
-            "water": 7.0,
-            "glycerin": 7.0,
-            "vitamin_c": 3.5,
-            "hyaluronic_acid": 6.5,
-            "phenoxyethanol": 6.0
-        }
-        
         weighted_ph = 0.0
         total_weight = 0.0
         
         for ingredient in formulation:
-            if ingredient.ingredient_id in ph_contributors:
-                ph = ph_contributors[ingredient.ingredient_id]
+            ph = _PH_CONTRIBUTORS.get(ingredient.ingredient_id)
+            if ph is not None:
                 weight = ingredient.concentration
                 weighted_ph += ph * weight
                 total_weight += weight
@@ -397,66 +488,26 @@ class FormulationEngine:
         
         return 6.5  # Default neutral pH
     
-    async def _predict_stability(self, formulation: List[FormulationIngredient]) -> float:
+    def _predict_stability(self, formulation: List[_Ing]) -> float:
         """Predict formulation stability score (0-10)"""
-        stability_score = 7.0  # Base score
-        
-        # Check for stability-affecting ingredients
-        has_emulsifier = any(f.function == IngredientFunction.EMULSIFIER for f in formulation)
-        has_preservative = any(f.function == IngredientFunction.PRESERVATIVE for f in formulation)
-        has_antioxidant = any(f.function == IngredientFunction.ANTIOXIDANT for f in formulation)
-        
-        if has_emulsifier:
-            stability_score += 1.0
-        if has_preservative:
-            stability_score += 1.5
-        if has_antioxidant:
-            stability_score += 0.5
+        # Base score plus one bonus per stability-affecting function present
+        functions = {f.function for f in formulation}
+        stability_score = 7.0 + sum(_STABILITY_BONUSES.get(f, 0.0) for f in functions)
         
         # Check for unstable combinations
-        ingredient_ids = [f.ingredient_id for f in formulation]
+        ingredient_ids = {f.ingredient_id for f in formulation}
         if "vitamin_c" in ingredient_ids and "retinol" in ingredient_ids:
             stability_score -= 2.0
         
         return min(10.0, max(0.0, round(stability_score, 1)))
     
-    async def _generate_instructions(
+    def _generate_instructions(
         self, 
-        formulation: List[FormulationIngredient], 
+        formulation: List[_Ing], 
         product_type: ProductType
     ) -> str:
         """Generate manufacturing instructions"""
-        
-        base_instructions = {
-            ProductType.CREAM: (
-                "1. Heat water phase ingredients to 70°C\n"
-                "2. Heat oil phase ingredients to 70°C\n"
-                "3. Slowly add oil phase to water phase with continuous mixing\n"
-                "4. Cool to 40°C while mixing\n"
-                "5. Add heat-sensitive actives below 40°C\n"
-                "6. Adjust pH if needed\n"
-                "7. Fill into sterilized containers"
-            ),
-            ProductType.SERUM: (
-                "1. Mix water and glycols at room temperature\n"
-                "2. Add water-soluble actives one by one\n"
-                "3. Mix until completely dissolved\n"
-                "4. Add preservative system\n"
-                "5. Adjust pH to 5.5-6.5\n"
-                "6. Fill into sterilized containers"
-            ),
-            ProductType.LOTION: (
-                "1. Heat water phase to 65°C\n"
-                "2. Heat oil phase to 65°C\n"
-                "3. Add oil phase to water phase with mixing\n"
-                "4. Cool to room temperature\n"
-                "5. Add actives and preservatives\n"
-                "6. Adjust pH and viscosity\n"
-                "7. Fill into containers"
-            )
-        }
-        
-        return base_instructions.get(product_type, "Standard cosmetic manufacturing process")
+        return _BASE_INSTRUCTIONS.get(product_type, "Standard cosmetic manufacturing process")
     
     async def check_compliance(self, formulation_data: Dict[str, Any]) -> ComplianceCheck:
         """Check formulation compliance with UKES/EU regulations"""
@@ -468,12 +519,16 @@ class FormulationEngine:
         
         regulatory_data = await self.db.get_regulatory_data()
         
+        entries = [
+            (ingredient_data.get("ingredient_id"), ingredient_data.get("concentration", 0))
+            for ingredient_data in formulation_data.get("ingredients", [])
+        ]
+        # Fetch every named ingredient in one call
+        lookup = await self.db.get_ingredients_by_ids(i for i, _ in entries)
+        
         # Check each ingredient
-        for ingredient_data in formulation_data.get("ingredients", []):
-            ingredient_id = ingredient_data.get("ingredient_id")
-            concentration = ingredient_data.get("concentration", 0)
-            
-            ingredient = await self.db.get_ingredient_by_id(ingredient_id)
+        for ingredient_id, concentration in entries:
+            ingredient = lookup.get(ingredient_id)
             if not ingredient:
                 continue
             
@@ -536,7 +591,7 @@ class FormulationEngine:
         # In practice, implement specific optimization algorithms based on target
         
         return FormulationResponse(
-            id=str(uuid.uuid4()),
+            id=secrets.token_hex(16),
             product_type=ProductType.CREAM,  # Default
             ingredients=[],
             total_percentage=100.0,
@@ -4,20 +4,28 @@ main.py
 Labrugis Ltd. 2025
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from typing import List, Optional, Dict, Any
+import hashlib
+import os
+import secrets
+import time
 import uvicorn
 from contextlib import asynccontextmanager
+from datetime import datetime
 from models import (
     FormulationRequest, 
     FormulationResponse, 
     Ingredient, 
     IngredientAdd,
     ComplianceCheck,
-    OptimizationRequest
+    OptimizationRequest,
+    ProductType
 )
-from database import DatabaseManager
+from database import DatabaseManager, LRUCache
 from logic import FormulationEngine
 
 
@@ -25,6 +33,43 @@ from logic import FormulationEngine
 db_manager = DatabaseManager()
 formulation_engine = FormulationEngine(db_manager)
 
+# Formulations keyed by (catalogue version, request digest); identical requests
+# against an unchanged catalogue produce identical formulations
+formulation_cache = LRUCache(1024)
+
+REGULATORY_INFO = {
+    "ukes_compliance": True,
+    "cpnp_ready": True,
+    "last_updated": "2025-01-01",
+    "prohibited_substances": "Updated per EU Regulation 1223/2009",
+    "concentration_limits": "Current as of 2025",
+    "labeling_requirements": "UK specific requirements included"
+}
+
+
+async def formulate(request: FormulationRequest) -> FormulationResponse:
+    """Generate a formulation, reusing the cached result for repeated requests"""
+    digest = hashlib.blake2b(request.model_dump_json().encode(), digest_size=16).digest()
+    key = (db_manager.catalog_version, digest)
+    formulation = formulation_cache.get(key)
+    if formulation is None:
+        formulation = await formulation_engine.generate_formulation(request)
+        formulation_cache.put(key, formulation)
+        return formulation
+    # Each response is still a distinct formulation record
+    return formulation.model_copy(update={"id": secrets.token_hex(16), "created_at": datetime.now()})
+
+
+async def warm_up():
+    """Run one formulation so the first real request finds snapshots and caches built"""
+    start = time.perf_counter()
+    try:
+        await formulate(FormulationRequest(product_type=ProductType.CREAM))
+    except Exception as e:
+        print(f"Warm-up formulation failed: {e}")
+        return
+    print(f"🔥 Warm-up formulation took {(time.perf_counter() - start) * 1000:.1f} ms")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize application on startup"""
@@ -32,8 +77,10 @@ async def lifespan(app: FastAPI):
     await db_manager.initialize()
     print("🧪 Cosmetic Formulation AI Agent initialized")
     print("📋 Database loaded with ingredients and templates")
+    await warm_up()
     yield
-    # Cleanup if needed
+    # Write any pending changes before exit
+    await db_manager.close()
     print("🔄 Shutting down gracefully")
 
 # Create FastAPI app
@@ -41,14 +88,26 @@ app = FastAPI(
     title="Cosmetic Formulation AI Agent",
     description="AI-powered cosmetic formulation system for UK market compliance",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
+# Compress larger JSON bodies (ingredient lists, formulations)
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
+# Add CORS middleware (added last so it wraps compression)
+# Comma-separated origins, e.g. CORS_ALLOW_ORIGINS="https://app.example.com"
+CORS_ALLOW_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get(
+        "CORS_ALLOW_ORIGINS", "http://localhost:3000,http://localhost:8000"
+    ).split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
-    allow_credentials=True,
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_credentials=False,  # No cookie/auth based sessions
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -67,16 +126,18 @@ async def root():
 async def get_ingredients(
     category: Optional[str] = None,
     function: Optional[str] = None,
-    limit: int = 100
+    limit: int = Query(100, ge=0),
+    max_cost_per_kg: Optional[float] = None
 ):
     """Get available ingredients with optional filtering"""
     try:
-        ingredients = await db_manager.get_ingredients(
+        payload = await db_manager.get_ingredients_json(
             category=category,
             function=function,
-            limit=limit
+            limit=limit,
+            max_cost_per_kg=max_cost_per_kg
         )
-        return ingredients
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -91,12 +152,24 @@ async def add_ingredient(ingredient: IngredientAdd):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ingredients/bulk", response_model=Dict[str, Any])
+async def add_ingredients_bulk(ingredients: List[IngredientAdd]):
+    """Add several ingredients in one request (single validation pass and save)"""
+    try:
+        result = await db_manager.add_ingredients_bulk(ingredients)
+        return {"message": f"{len(result)} ingredients added successfully", "ids": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/formulate", response_model=FormulationResponse)
 async def create_formulation(request: FormulationRequest):
     """Generate cosmetic formulation based on requirements"""
     try:
-        formulation = await formulation_engine.generate_formulation(request)
-        return formulation
+        formulation = await formulate(request)
+        # Serialised in one pass by pydantic-core instead of dict -> encoder -> JSON
+        return Response(content=formulation.model_dump_json(), media_type="application/json")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -116,7 +189,7 @@ async def optimize_formulation(request: OptimizationRequest):
     """Optimize existing formulation for cost, stability, or performance"""
     try:
         optimized = await formulation_engine.optimize_formulation(request)
-        return optimized
+        return Response(content=optimized.model_dump_json(), media_type="application/json")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -126,22 +199,15 @@ async def optimize_formulation(request: OptimizationRequest):
 async def get_templates(product_type: Optional[str] = None):
     """Get available formulation templates"""
     try:
-        templates = await db_manager.get_templates(product_type)
-        return templates
+        payload = await db_manager.get_templates_json(product_type)
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/regulatory-info")
 async def get_regulatory_info():
     """Get current UK/EU regulatory information"""
-    return {
-        "ukes_compliance": True,
-        "cpnp_ready": True,
-        "last_updated": "2025-01-01",
-        "prohibited_substances": "Updated per EU Regulation 1223/2009",
-        "concentration_limits": "Current as of 2025",
-        "labeling_requirements": "UK specific requirements included"
-    }
+    return REGULATORY_INFO
 
 if __name__ == "__main__":
     uvicorn.run(
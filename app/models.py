@@ -4,8 +4,8 @@ models.py
 Labrugis Ltd. 2025
 """
 
-from pydantic import BaseModel, Field, validator, ConfigDict
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, model_validator, ConfigDict
+from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime
 
@@ -42,9 +42,49 @@ class ComplianceStatus(str, Enum):
     REQUIRES_REVIEW = "requires_review"
 
 
-class Ingredient(BaseModel):
+def _check_concentration_range(model):
+    """Shared min/max concentration cross-check for ingredient models"""
+    if model.max_concentration is not None and model.min_concentration is not None:
+        if model.max_concentration < model.min_concentration:
+            raise ValueError('max_concentration must be >= min_concentration')
+    return model
+
+
+class TrustedModel(BaseModel):
+    """Base for models also built from data the application produced itself"""
+    
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]):
+        """Build without validation (nested models must already be built)"""
+        return cls.model_construct(**data)
+
+
+class PHRange(TrustedModel):
+    """pH range as a min/max pair"""
+    model_config = ConfigDict(frozen=True)
+    
+    min: float
+    max: float
+
+
+class CostRange(TrustedModel):
+    """Cost range (per kg) as a min/max pair"""
+    model_config = ConfigDict(frozen=True)
+    
+    min: float
+    max: float
+
+
+class BaseIngredientSpec(BaseModel):
+    """Template ingredient with its default concentration"""
+    model_config = ConfigDict(frozen=True)
+    
+    ingredient_id: str
+    concentration: float
+
+
+class Ingredient(TrustedModel):
     """Base ingredient model with UK/EU compliance data"""
-    model_config = ConfigDict(str_strip_whitespace=True)
     
     id: str
     name: str
@@ -62,7 +102,7 @@ class Ingredient(BaseModel):
     
     # Physical/chemical properties
     molecular_weight: Optional[float] = None
-    ph_range: Optional[Dict[str, float]] = None
+    ph_range: Optional[PHRange] = None
     solubility: Optional[str] = None
     stability_notes: Optional[str] = None
     
@@ -72,16 +112,18 @@ class Ingredient(BaseModel):
     natural_origin: bool = False
     organic_certified: bool = False
     
-    @validator('max_concentration')
-    def validate_max_concentration(cls, v, values):
-        if v is not None and 'min_concentration' in values and values['min_concentration'] is not None:
-            if v < values['min_concentration']:
-                raise ValueError('max_concentration must be >= min_concentration')
-        return v
+    # Runs after all fields are set, so min_concentration is available
+    # regardless of field order
+    @model_validator(mode='after')
+    def validate_concentration_range(self):
+        return _check_concentration_range(self)
 
 
 class IngredientAdd(BaseModel):
     """Model for adding new ingredients"""
+    # Client input is the one place strings arrive untrimmed
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     name: str = Field(..., min_length=1)
     inci_name: str = Field(..., min_length=1)
     cas_number: Optional[str] = None
@@ -93,10 +135,16 @@ class IngredientAdd(BaseModel):
     restricted_in_eu: bool = False
     cost_per_kg: Optional[float] = Field(None, gt=0)
     natural_origin: bool = False
+    
+    @model_validator(mode='after')
+    def validate_concentration_range(self):
+        return _check_concentration_range(self)
 
 
-class FormulationIngredient(BaseModel):
+class FormulationIngredient(TrustedModel):
     """Ingredient with specific concentration in formulation"""
+    model_config = ConfigDict(frozen=True)
+    
     ingredient_id: str
     name: str
     inci_name: str
@@ -120,8 +168,10 @@ class FormulationRequest(BaseModel):
     cpnp_ready: bool = True
 
 
-class FormulationResponse(BaseModel):
+class FormulationResponse(TrustedModel):
     """Response containing generated formulation"""
+    model_config = ConfigDict(frozen=True)
+    
     id: str
     product_type: ProductType
     ingredients: List[FormulationIngredient]
@@ -136,7 +186,8 @@ class FormulationResponse(BaseModel):
     shelf_life_estimate: Optional[int] = None  # months
     created_at: datetime = Field(default_factory=datetime.now)
     
-    @validator('total_percentage')
+    @field_validator('total_percentage')
+    @classmethod
     def validate_total_percentage(cls, v):
         if not (99.0 <= v <= 100.0):
             raise ValueError('Total percentage should be between 99-100%')
@@ -183,14 +234,16 @@ class OptimizationRequest(BaseModel):
     max_changes: int = Field(3, ge=1, le=10)
 
 
-class PeptideData(BaseModel):
+class PeptideData(TrustedModel):
     """Specialized model for peptide ingredients"""
+    model_config = ConfigDict(frozen=True)
+    
     id: str
     name: str
     sequence: str
     molecular_weight: float
     function: str
-    stability_ph_range: Dict[str, float]
+    stability_ph_range: PHRange
     max_concentration: float
     cost_per_gram: float
     efficacy_studies: List[str] = Field(default_factory=list)
@@ -205,8 +258,22 @@ class FormularyTemplate(BaseModel):
     id: str
     name: str
     product_type: ProductType
-    base_ingredients: List[Dict[str, Union[str, float]]]
+    base_ingredients: List[BaseIngredientSpec]
     variable_ingredients: List[str]
     instructions: str
-    typical_cost_range: Dict[str, float]
-    stability_notes: Optional[str] = None
\ No newline at end of file
+    typical_cost_range: CostRange
+    stability_notes: Optional[str] = None
+
+
+# Compiled once at import: each validates or dumps a whole batch in a single
+# pydantic-core call
+INGREDIENT_LIST_ADAPTER = TypeAdapter(List[Ingredient])
+PEPTIDE_MAP_ADAPTER = TypeAdapter(Dict[str, PeptideData])
+TEMPLATE_MAP_ADAPTER = TypeAdapter(Dict[str, FormularyTemplate])
+TEMPLATE_LIST_ADAPTER = TypeAdapter(List[FormularyTemplate])
+
+# Value -> member tables: a dict hit instead of Enum.__call__ where the app
+# converts stored strings itself. Members hash like their values, so
+# already-converted inputs resolve too
+INGREDIENT_FUNCTION_LOOKUP: Dict[str, IngredientFunction] = {m.value: m for m in IngredientFunction}
+PRODUCT_TYPE_LOOKUP: Dict[str, ProductType] = {m.value: m for m in ProductType}
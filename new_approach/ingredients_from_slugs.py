@@ -1,83 +1,79 @@
 # fetch_ingredients_from_slugs_grouped.py
 
-import os
-import json
-import time
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import orjson
+from pathlib import Path
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-}
+from scrape_core import Fetcher, fetch_product
+
+SLUGS_DIR = Path("data/slugs")
+PEPTIDES_DIR = Path("data/peptides")
 
 def load_slugs(json_path):
-    with open(json_path, "r") as f:
-        return json.load(f)
-
-def scrape_inci_product(product_slug):
-    url = f"https://incidecoder.com/products/{product_slug}"
-    res = requests.get(url, headers=headers)
-    if res.status_code != 200:
-        return None
-
-    soup = BeautifulSoup(res.text, 'html.parser')
-
-    title_tag = soup.select_one('h1')
-    title = title_tag.text.strip() if title_tag else "Unknown"
-
-    ingredients = []
-    skim_header_tag = soup.find('h2', string=lambda t: t and 'skim through' in t.lower())
-    if skim_header_tag:
-        table = skim_header_tag.find_next('table')
-        if table:
-            rows = table.select('tbody tr')
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) >= 4:
-                    ingredients.append({
-                        'name': cols[0].get_text(strip=True),
-                        'function': cols[1].get_text(strip=True),
-                        'irr_com': cols[2].get_text(strip=True),
-                        'rating': cols[3].get_text(strip=True)
-                    })
-
-    return {
-        'name': title,
-        'slug': product_slug,
-        'ingredients': ingredients
-    }
+    return orjson.loads(Path(json_path).read_bytes())
+
+def read_progress(jsonl_path):
+    # Yield products from a JSONL progress log, ignoring a torn last line
+    if not jsonl_path.exists():
+        return
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
 
 def save_grouped_products(peptide_slug, peptide_name, all_products):
-    os.makedirs("data/peptides", exist_ok=True)
-    path = f"data/peptides/{peptide_slug}.json"
-    with open(path, "w") as f:
-        json.dump({
-            "peptide": peptide_name,
-            "products": all_products
-        }, f, indent=2, ensure_ascii=False)
+    path = PEPTIDES_DIR / f"{peptide_slug}.json"
+    path.write_bytes(orjson.dumps({
+        "peptide": peptide_name,
+        "products": all_products
+    }, option=orjson.OPT_INDENT_2))
     print(f"✅ Saved: {path}")
 
-def main():
+async def main():
+    PEPTIDES_DIR.mkdir(parents=True, exist_ok=True)
     peptide_slug = input("🔍 Enter peptide slug (e.g. palmitoyl_tetrapeptide_7): ").strip()
-    filepath = f"data/slugs/{peptide_slug}.json"
+    filepath = SLUGS_DIR / f"{peptide_slug}.json"
 
-    if not os.path.exists(filepath):
+    if not filepath.exists():
         print("⚠️ Slug list not found.")
         return
 
-    slugs = load_slugs(filepath)
-    all_products = []
-
-    for entry in slugs:
-        print(f"🔎 Fetching: {entry['name']} → {entry['slug']}")
-        product = scrape_inci_product(entry['slug'])
-
-        if product and product['ingredients']:
-            all_products.append(product)
-        else:
-            print(f"⚠️ Skipped or no ingredients found: {entry['slug']}")
-
-        time.sleep(1.0)
+    # Each product only needs scraping once, however often it was listed
+    slugs = list({entry['slug']: entry for entry in load_slugs(filepath)}.values())
+
+    # Products are appended to a JSONL log as they finish, so an interrupted
+    # run resumes where it stopped instead of starting over
+    progress_path = PEPTIDES_DIR / f"{peptide_slug}.jsonl"
+    done_slugs = {product['slug'] for product in read_progress(progress_path)}
+    pending = [entry for entry in slugs if entry['slug'] not in done_slugs]
+    if done_slugs:
+        print(f"⏩ Resuming: {len(done_slugs)} products already scraped")
+
+    # Fetch concurrently (bounded and paced by the Fetcher)
+    print(f"🔎 Fetching {len(pending)} products")
+    with open(progress_path, "a+b") as progress:
+        # Start on a fresh line if the last run died mid-write
+        if progress.tell():
+            progress.seek(-1, 2)
+            if progress.read(1) != b"\n":
+                progress.write(b"\n")
+
+        async with Fetcher() as fetcher:
+            async def scrape_and_record(entry):
+                product = await fetch_product(fetcher, entry['slug'])
+                if product and product['ingredients']:
+                    progress.write(orjson.dumps(product) + b"\n")
+                    progress.flush()
+                else:
+                    print(f"⚠️ Skipped or no ingredients found: {entry['slug']}")
+
+            await asyncio.gather(*(scrape_and_record(entry) for entry in pending))
+
+    # Group everything scraped so far, in slug list order
+    by_slug = {product['slug']: product for product in read_progress(progress_path)}
+    all_products = [by_slug[entry['slug']] for entry in slugs if entry['slug'] in by_slug]
 
     if all_products:
         save_grouped_products(peptide_slug, peptide_slug.replace("_", " ").title(), all_products)
@@ -85,4 +81,4 @@ def main():
         print("❌ No products saved.")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
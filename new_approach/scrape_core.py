@@ -0,0 +1,224 @@
+# scrape_core.py
+# Shared HTTP plumbing and product page parsing for the incidecoder scrapers
+
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import orjson
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from selectolax.lexbor import LexborHTMLParser
+
+# Ask for compressed HTML; httpx decodes gzip and (with brotli installed) br transparently
+headers = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Encoding": "gzip, br"
+}
+
+# Requests in flight at once, and the overall request rate to the site.
+# Sends are spaced 1/REQUESTS_PER_SECOND apart however long each response takes
+MAX_CONCURRENCY = 8
+REQUESTS_PER_SECOND = 1.0
+
+# One pooled HTTP/2 client is shared by every request, so TLS sockets are
+# reused and concurrent page requests multiplex over the same connection
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+
+# Transient failures (network errors, 429 and 5xx responses) are retried with
+# exponential backoff plus jitter, or after the server's Retry-After if given
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Pages younger than CACHE_TTL seconds are served from disk without a request;
+# older ones are revalidated with their ETag / Last-Modified
+HTTP_CACHE_DIR = "data/http_cache"
+CACHE_TTL = 86400
+
+
+class Fetcher:
+    """Async HTTP client that caps concurrency and request rate to one host and caches pages on disk"""
+
+    def __init__(self, concurrency=MAX_CONCURRENCY, rate=REQUESTS_PER_SECOND,
+                 cache_dir=HTTP_CACHE_DIR, cache_ttl=CACHE_TTL):
+        # httpx is the slowest import here; loading it on first use keeps the
+        # CLIs' startup (and process pool workers) from paying for it
+        import httpx
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                              max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+        self.client = httpx.AsyncClient(headers=headers, timeout=10, follow_redirects=True,
+                                        http2=True, limits=limits)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_send = time.monotonic()
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def _wait_turn(self):
+        # Reserve the next send slot, then sleep until it comes round
+        now = time.monotonic()
+        slot = max(now, self._next_send)
+        self._next_send = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    @staticmethod
+    def _retry_delay(res, attempt):
+        # Honour Retry-After (seconds or an HTTP date), else back off exponentially
+        retry_after = res.headers.get("Retry-After") if res is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0.0), BACKOFF_MAX)
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+    def _cache_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _cache_load(self, url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url), "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _cache_store(self, url, entry):
+        if not self.cache_dir:
+            return
+        with open(self._cache_path(url), "wb") as f:
+            f.write(orjson.dumps(entry))
+
+    async def get_text(self, url, params=None):
+        """Fetch a page body, or None on a network error or non-200 status
+
+        A cached copy is returned while fresh, after a 304, or if the request
+        still fails after MAX_ATTEMPTS tries.
+        """
+        import httpx
+
+        full_url = str(httpx.URL(url, params=params))
+        entry = self._cache_load(full_url)
+        if entry and time.time() - entry["fetched_at"] < self.cache_ttl:
+            return entry["body"]
+
+        conditional = {}
+        if entry and entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+
+        for attempt in range(MAX_ATTEMPTS):
+            res = error = None
+            async with self.semaphore:
+                await self._wait_turn()
+                try:
+                    res = await self.client.get(full_url, headers=conditional)
+                except httpx.TransportError as e:
+                    error = e
+                except httpx.HTTPError as e:
+                    print(f"❌ Request failed for {full_url}: {e}")
+                    return entry["body"] if entry else None
+
+            if res is not None and res.status_code not in RETRY_STATUSES:
+                break
+            reason = error if error is not None else f"HTTP {res.status_code}"
+            if attempt == MAX_ATTEMPTS - 1:
+                print(f"❌ Request failed for {full_url}: {reason}")
+                return entry["body"] if entry else None
+
+            # Back off outside the semaphore so other requests keep flowing
+            delay = self._retry_delay(res, attempt)
+            print(f"🔁 Retrying {full_url} in {delay:.1f}s ({reason})")
+            await asyncio.sleep(delay)
+
+        if res.status_code == 304 and entry:
+            entry["fetched_at"] = time.time()
+            self._cache_store(full_url, entry)
+            return entry["body"]
+
+        if res.status_code != 200:
+            return None
+
+        self._cache_store(full_url, {
+            "fetched_at": time.time(),
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "body": res.text
+        })
+        return res.text
+
+
+# Selectors and matchers used on every product page
+SEL_TITLE = 'h1'
+SEL_HEADINGS_AND_TABLES = 'h2, table'
+SEL_ROWS = 'tbody tr'
+_SKIM_RE = re.compile(r'skim through', re.I)
+
+def find_skim_table(tree):
+    # The ingredient table is the first table after the "Skim through" heading
+    # (css() returns matches in document order)
+    after_header = False
+    for node in tree.css(SEL_HEADINGS_AND_TABLES):
+        if node.tag == 'h2':
+            after_header = after_header or _SKIM_RE.search(node.text()) is not None
+        elif after_header:
+            return node
+    return None
+
+def parse_product(html, product_slug):
+    tree = LexborHTMLParser(html)
+
+    title_tag = tree.css_first(SEL_TITLE)
+    title = title_tag.text().strip() if title_tag else "Unknown"
+
+    ingredients = []
+    table = find_skim_table(tree)
+    if table:
+        rows = table.css(SEL_ROWS)
+        for row in rows:
+            # Cells are the row's direct children; walking them avoids a CSS query per row
+            cols = [node for node in row.iter() if node.tag == 'td']
+            if len(cols) >= 4:
+                ingredients.append({
+                    'name': cols[0].text(strip=True),
+                    'function': cols[1].text(strip=True),
+                    'irr_com': cols[2].text(strip=True),
+                    'rating': cols[3].text(strip=True)
+                })
+
+    return {
+        'name': title,
+        'slug': product_slug,
+        'ingredients': ingredients
+    }
+
+async def fetch_product(fetcher, product_slug):
+    url = f"https://incidecoder.com/products/{product_slug}"
+    html = await fetcher.get_text(url)
+    if html is None:
+        return None
+
+    # Parsing takes a couple of ms against a request budget of seconds, so it runs inline
+    return parse_product(html, product_slug)
@@ -1,65 +1,72 @@
 # Begin here
-import os
-import json
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import orjson
+from pathlib import Path
+from selectolax.lexbor import LexborHTMLParser
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-}
+from scrape_core import Fetcher
+
+SLUGS_DIR = Path("data/slugs")
+
+# Product links on a search results page
+SEL_PRODUCT_LINKS = 'div.std-side-padding > a.klavika.simpletextlistitem'
 
 def slugify_peptide(peptide_name):
     return peptide_name.lower().replace(" ", "_")
 
-def slugs_generator(peptide_name, max_pages=20):
+def parse_search_page(html):
+    tree = LexborHTMLParser(html)
+    product_links = tree.css(SEL_PRODUCT_LINKS)
+
+    page_products = []
+    for link in product_links:
+        product_name = link.text().strip()
+        href = link.attributes.get('href')
+        slug = href.split('/products/')[-1] if href and '/products/' in href else None
+        if slug:
+            page_products.append({"name": product_name, "slug": slug})
+
+    return page_products
+
+async def slugs_generator(peptide_name, max_pages=20):
     base_url = "https://incidecoder.com/search/product"
     all_products = []
-
-    for page in range(1, max_pages + 1):
-        params = {
-            "query": "",
-            "include": peptide_name,
-            "page": page
-        }
-        res = requests.get(base_url, params=params, headers=headers)
-        if res.status_code != 200:
-            print(f"❌ Failed to fetch page {page} for peptide '{peptide_name}'")
-            break
-
-        soup = BeautifulSoup(res.text, 'html.parser')
-        product_links = soup.select('div.std-side-padding > a.klavika.simpletextlistitem')
-
-        if not product_links:
-            print(f"📭 No more results found after page {page - 1}")
-            break
-
-        page_products = []
-        for link in product_links:
-            product_name = link.text.strip()
-            href = link.get('href')
-            slug = href.split('/products/')[-1] if href and '/products/' in href else None
-            if slug:
-                page_products.append({"name": product_name, "slug": slug})
-
-        all_products.extend(page_products)
+    seen = set()
+
+    async with Fetcher() as fetcher:
+        # The Fetcher paces requests anyway, so fetch one page at a time and
+        # never request a page past the last one with results
+        for page in range(1, max_pages + 1):
+            html = await fetcher.get_text(base_url, params={"query": "", "include": peptide_name, "page": page})
+            if html is None:
+                print(f"❌ Failed to fetch page {page} for peptide '{peptide_name}'")
+                break
+
+            # A page of nothing but already-seen products means the
+            # results have stopped growing
+            page_products = [p for p in parse_search_page(html) if p["slug"] not in seen]
+            if not page_products:
+                print(f"📭 No more results found after page {page - 1}")
+                break
+
+            seen.update(p["slug"] for p in page_products)
+            all_products.extend(page_products)
 
     return all_products
 
 def save_slugs(peptide_name, products):
     slugified = slugify_peptide(peptide_name)
-    out_path = f"data/slugs/{slugified}.json"
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-
-    with open(out_path, "w") as f:
-        json.dump(products, f, indent=2, ensure_ascii=False)
+    out_path = SLUGS_DIR / f"{slugified}.json"
+    out_path.write_bytes(orjson.dumps(products, option=orjson.OPT_INDENT_2))
 
     print(f"\n💾 Saved {len(products)} products to {out_path}")
 
 def main():
+    SLUGS_DIR.mkdir(parents=True, exist_ok=True)
     peptide_name = input("🔍 Enter a peptide name to search: ").strip()
     print(f"\n🔎 Searching for products containing: {peptide_name}\n")
 
-    products = slugs_generator(peptide_name)
+    products = asyncio.run(slugs_generator(peptide_name))
 
     if not products:
         print("⚠️ No products found.")
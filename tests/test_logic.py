@@ -0,0 +1,536 @@
+"""
+Behaviour tests for the formulation API, database, engine and scrapers
+test_logic.py
+Labrugis Ltd. 2025
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+# The app and scraper modules import each other top-level (run from their own directories)
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "app"))
+sys.path.insert(0, str(ROOT / "new_approach"))
+
+import main
+import ingredients_from_slugs
+import scrape_core
+import slugs_generator
+from database import DatabaseManager, LRUCache
+from logic import FormulationEngine
+from models import (
+    ComplianceStatus,
+    FormulationRequest,
+    Ingredient,
+    IngredientAdd,
+    IngredientFunction,
+    PHRange,
+    ProductType
+)
+
+
+def ingredient_payload(name: str, inci_name: str, **fields) -> dict:
+    """Body for POST /ingredients(/bulk)"""
+    return {"name": name, "inci_name": inci_name, "function": "moisturiser", "category": "emollient", **fields}
+
+
+async def open_db(data_path: Path) -> DatabaseManager:
+    """Initialised database rooted at a temporary directory"""
+    db = DatabaseManager(str(data_path))
+    await db.initialize()
+    return db
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API client whose database lives in tmp_path, never the checked-in JSON"""
+    db = DatabaseManager(str(tmp_path))
+    monkeypatch.setattr(main, "db_manager", db)
+    monkeypatch.setattr(main, "formulation_engine", FormulationEngine(db))
+    monkeypatch.setattr(main, "formulation_cache", LRUCache(1024))
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+async def mock_fetcher(handler, **kwargs) -> scrape_core.Fetcher:
+    """Fetcher whose requests are answered by handler instead of the network"""
+    fetcher = scrape_core.Fetcher(**kwargs)
+    await fetcher.client.aclose()
+    fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher
+
+
+@pytest.mark.asyncio
+async def test_load_keeps_records_missing_optional_keys(tmp_path):
+    records = {
+        "minimal": {
+            "id": "minimal",
+            "name": "Minimal",
+            "inci_name": "Minimal INCI",
+            "function": "moisturiser",
+            "category": "moisturiser"
+        },
+        "with_ph": {
+            "id": "with_ph",
+            "name": "With pH",
+            "inci_name": "With pH INCI",
+            "function": "moisturiser",
+            "category": "moisturiser",
+            "ph_range": {"min": 4.0, "max": 6.0}
+        }
+    }
+    (tmp_path / "ingredients.json").write_text(json.dumps(records))
+
+    db = await open_db(tmp_path)
+    try:
+        assert set(db.ingredients) == {"minimal", "with_ph"}
+        minimal = db.ingredients["minimal"]
+        assert minimal.ph_range is None
+        assert minimal.max_concentration is None
+        assert minimal.prohibited_in_eu is False
+        assert minimal.function is IngredientFunction.MOISTURISER
+        assert db.ingredients["with_ph"].ph_range == PHRange(min=4.0, max=6.0)
+    finally:
+        await db.close()
+
+    # The user's file must not have been replaced by the seed data
+    assert set(json.loads((tmp_path / "ingredients.json").read_text())) == {"minimal", "with_ph"}
+
+
+@pytest.mark.asyncio
+async def test_complementary_fill_continues_past_top_candidates(tmp_path):
+    db = await open_db(tmp_path)
+    try:
+        # Far more tiny actives than the ranked fast path looks at first
+        for i in range(300):
+            db.ingredients[f"act{i}"] = Ingredient(
+                id=f"act{i}", name=f"Active {i}", inci_name=f"Active {i}",
+                function=IngredientFunction.ACTIVE, category="active",
+                max_concentration=0.1
+            )
+        db._rebuild_indexes()
+        db._catalog_changed()
+
+        engine = FormulationEngine(db)
+        formulation = await engine.generate_formulation(FormulationRequest(product_type=ProductType.CREAM))
+        picked = {i.ingredient_id for i in formulation.ingredients}
+        assert {f"act{i}" for i in range(300)} <= picked
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_save_is_retried(tmp_path):
+    db = await open_db(tmp_path)
+    db.retry_delay = 0.01
+    save_ingredients = db._savers["ingredients"]
+    attempts = 0
+
+    async def flaky_save():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise OSError("disk full")
+        await save_ingredients()
+
+    db._savers["ingredients"] = flaky_save
+    try:
+        new_id = await db.add_ingredient(IngredientAdd(
+            name="Squalane", inci_name="Squalane", function=IngredientFunction.MOISTURISER,
+            category="emollient"
+        ))
+        for _ in range(200):
+            if attempts >= 2 and not db._dirty:
+                break
+            await asyncio.sleep(0.01)
+        assert attempts == 2
+        assert new_id in json.loads((tmp_path / "ingredients.json").read_text())
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_close_writes_pending_changes(tmp_path):
+    db = await open_db(tmp_path)
+    db.flush_delay = 10
+    new_id = await db.add_ingredient(IngredientAdd(
+        name="Squalane", inci_name="Squalane", function=IngredientFunction.MOISTURISER,
+        category="emollient"
+    ))
+    await db.close()
+    assert new_id in json.loads((tmp_path / "ingredients.json").read_text())
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_ingredients_rejects_negative_limit(client):
+    assert client.get("/ingredients", params={"limit": -1}).status_code == 422
+
+
+def test_bulk_add_inserts_every_ingredient(client):
+    res = client.post("/ingredients/bulk", json=[
+        ingredient_payload("Squalane", "Squalane"),
+        ingredient_payload("Jojoba Oil", "Simmondsia Chinensis Seed Oil", max_concentration=10.0)
+    ])
+    assert res.status_code == 200
+    ids = res.json()["ids"]
+    assert len(ids) == 2
+
+    listed = {i["id"]: i for i in client.get("/ingredients", params={"limit": 1000}).json()}
+    assert {listed[i]["inci_name"] for i in ids} == {"Squalane", "Simmondsia Chinensis Seed Oil"}
+
+
+@pytest.mark.parametrize("batch", [
+    # Clashes with a seeded ingredient (case-insensitive INCI name)
+    [ingredient_payload("Squalane", "Squalane"), ingredient_payload("Water", "aqua")],
+    # Clashes within the batch itself
+    [ingredient_payload("Squalane", "Squalane"), ingredient_payload("Squalane again", "SQUALANE")]
+])
+def test_bulk_add_is_all_or_nothing_on_duplicates(client, batch):
+    before = client.get("/ingredients", params={"limit": 1000}).json()
+
+    res = client.post("/ingredients/bulk", json=batch)
+    assert res.status_code == 400
+    assert "already exists" in res.json()["detail"]
+
+    assert client.get("/ingredients", params={"limit": 1000}).json() == before
+
+
+def test_bulk_add_rejects_invalid_items(client):
+    res = client.post("/ingredients/bulk", json=[
+        ingredient_payload("Squalane", "Squalane"),
+        ingredient_payload("Broken", "Broken", min_concentration=5.0, max_concentration=1.0)
+    ])
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_max_cost_filter_tracks_catalogue_changes(tmp_path):
+    db = await open_db(tmp_path)
+    try:
+        expected = {i.id for i in db.ingredients.values() if i.cost_per_kg is not None and i.cost_per_kg <= 10.0}
+        assert expected
+        assert {i.id for i in await db.get_ingredients(max_cost_per_kg=10.0, limit=1000)} == expected
+
+        # Ingredients without a cost never match a cost ceiling
+        uncosted = await db.add_ingredient(IngredientAdd(
+            name="Squalane", inci_name="Squalane", function=IngredientFunction.MOISTURISER,
+            category="emollient"
+        ))
+        cheap = await db.add_ingredient(IngredientAdd(
+            name="Cheap Oil", inci_name="Cheap Oil", function=IngredientFunction.MOISTURISER,
+            category="carrier oil", cost_per_kg=0.5
+        ))
+        filtered = {i.id for i in await db.get_ingredients(max_cost_per_kg=10.0, limit=1000)}
+        assert filtered == expected | {cheap}
+        assert uncosted not in filtered
+
+        # Combines with the other filters
+        assert [i.id for i in await db.get_ingredients(category="carrier oil", max_cost_per_kg=1.0)] == [cheap]
+        assert await db.get_ingredients(category="carrier oil", max_cost_per_kg=0.1) == []
+    finally:
+        await db.close()
+
+
+def test_formulate_with_moisturizing_target(client):
+    # Scoring used to look up IngredientFunction.MOISTURIZER, which does not exist
+    res = client.post("/formulate", json={
+        "product_type": "cream",
+        "target_properties": {"moisturizing": True, "anti_aging": True}
+    })
+    assert res.status_code == 200
+    formulation = res.json()
+    assert sum(i["concentration"] for i in formulation["ingredients"]) == pytest.approx(100.0, abs=0.05)
+    assert "moisturiser" in {i["function"] for i in formulation["ingredients"]}
+
+
+def test_formulate_cache_is_dropped_after_an_insert(client):
+    request = {"product_type": "cream", "target_properties": {"anti_aging": True}}
+    first = client.post("/formulate", json=request).json()
+    repeat = client.post("/formulate", json=request).json()
+
+    # A cache hit is still a distinct formulation record
+    assert repeat["id"] != first["id"]
+    assert repeat["ingredients"] == first["ingredients"]
+
+    res = client.post("/ingredients", json=ingredient_payload(
+        "Peptide Complex", "Palmitoyl Tripeptide-1", function="active", category="peptide",
+        max_concentration=5.0
+    ))
+    assert res.status_code == 200
+    new_id = res.json()["id"]
+
+    after = client.post("/formulate", json=request).json()
+    assert new_id not in {i["ingredient_id"] for i in first["ingredients"]}
+    assert new_id in {i["ingredient_id"] for i in after["ingredients"]}
+
+
+@pytest.mark.asyncio
+async def test_check_compliance_flags_limits_and_restrictions(tmp_path):
+    db = await open_db(tmp_path)
+    try:
+        engine = FormulationEngine(db)
+        check = await engine.check_compliance({"ingredients": [
+            {"ingredient_id": "water", "concentration": 80.0},
+            {"ingredient_id": "phenoxyethanol", "concentration": 2.0},
+            {"ingredient_id": "unknown", "concentration": 1.0}
+        ]})
+        assert [(i.ingredient_id, i.issue_type) for i in check.issues] == [("phenoxyethanol", "concentration_limit")]
+        assert check.concentration_violations == ["Phenoxyethanol: 2.0% (max: 1.0%)"]
+        assert check.warnings == ["Phenoxyethanol is restricted - verify compliance"]
+        assert check.overall_status == ComplianceStatus.REQUIRES_REVIEW
+
+        check = await engine.check_compliance({"ingredients": [
+            {"ingredient_id": "water", "concentration": 80.0}
+        ]})
+        assert check.issues == []
+        assert check.overall_status == ComplianceStatus.COMPLIANT
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_fetcher_serves_fresh_pages_from_disk(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text="page", headers={"ETag": '"v1"'})
+
+    async with (await mock_fetcher(handler, cache_dir=str(tmp_path), rate=0)) as fetcher:
+        assert await fetcher.get_text("https://example.test/p", params={"page": 1}) == "page"
+        assert await fetcher.get_text("https://example.test/p", params={"page": 1}) == "page"
+        assert await fetcher.get_text("https://example.test/p", params={"page": 2}) == "page"
+    assert [str(r.url) for r in requests] == ["https://example.test/p?page=1", "https://example.test/p?page=2"]
+
+
+@pytest.mark.asyncio
+async def test_fetcher_revalidates_stale_pages(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text="page", headers={
+            "ETag": '"v1"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"
+        })
+
+    async with (await mock_fetcher(handler, cache_dir=str(tmp_path), cache_ttl=0, rate=0)) as fetcher:
+        assert await fetcher.get_text("https://example.test/p") == "page"
+        assert await fetcher.get_text("https://example.test/p") == "page"
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+    assert requests[1].headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+
+@pytest.mark.asyncio
+async def test_fetcher_falls_back_to_stale_copy_when_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_core, "MAX_ATTEMPTS", 1)
+    online = True
+
+    def handler(request):
+        if not online:
+            raise httpx.ConnectError("offline", request=request)
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, text="page")
+
+    async with (await mock_fetcher(handler, cache_dir=str(tmp_path), cache_ttl=0, rate=0)) as fetcher:
+        assert await fetcher.get_text("https://example.test/p") == "page"
+        assert await fetcher.get_text("https://example.test/missing") is None
+        online = False
+        assert await fetcher.get_text("https://example.test/p") == "page"
+        assert await fetcher.get_text("https://example.test/never-fetched") is None
+
+
+@pytest.mark.parametrize("model", [IngredientAdd, Ingredient])
+def test_concentration_range_is_checked(model):
+    fields = {"id": "x", "name": "X", "inci_name": "X", "function": "moisturiser", "category": "emollient"}
+    with pytest.raises(ValidationError, match="max_concentration must be >= min_concentration"):
+        model(**fields, min_concentration=5.0, max_concentration=1.0)
+
+    # Field order must not matter, and equal bounds are fine
+    ok = model(**{"max_concentration": 2.0, "min_concentration": 2.0, **fields})
+    assert ok.max_concentration == ok.min_concentration == 2.0
+
+
+def search_page(*slugs: str) -> str:
+    """Search results page listing the given product slugs"""
+    links = "".join(
+        f'<a class="klavika simpletextlistitem" href="/products/{slug}">{slug.upper()}</a>'
+        for slug in slugs
+    )
+    return f'<html><body><div class="std-side-padding">{links}</div></body></html>'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pages, expected_fetches", [
+    # Stops at the first empty page
+    ([("a", "b"), ("b", "c"), ()], 3),
+    # Stops once a page only repeats products already seen
+    ([("a", "b"), ("b", "c"), ("a", "c"), ("d",)], 3)
+])
+async def test_slugs_are_deduplicated_and_paging_stops_early(tmp_path, monkeypatch, pages, expected_fetches):
+    # The Fetcher creates its page cache relative to the current directory
+    monkeypatch.chdir(tmp_path)
+    fetched = []
+
+    async def fake_get_text(self, url, params=None):
+        fetched.append(params["page"])
+        return search_page(*pages[params["page"] - 1])
+
+    monkeypatch.setattr(scrape_core.Fetcher, "get_text", fake_get_text)
+
+    products = await slugs_generator.slugs_generator("matrixyl", max_pages=10)
+    assert [p["slug"] for p in products] == ["a", "b", "c"]
+    assert fetched == list(range(1, expected_fetches + 1))
+
+
+PRODUCT_PAGE = """
+<html><body>
+<h1>{name}</h1>
+<h2>Skim through</h2>
+<table><tbody>
+<tr><td>Aqua</td><td>solvent</td><td></td><td></td></tr>
+<tr><td>Glycerin</td><td>moisturiser</td><td>0, 0</td><td>superstar</td></tr>
+</tbody></table>
+</body></html>
+"""
+
+
+@pytest.mark.asyncio
+async def test_scrape_resumes_from_progress_log(tmp_path, monkeypatch):
+    # The scraper works relative to the current directory (data/...)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("builtins.input", lambda *_: "pep")
+    slugs_dir = tmp_path / "data" / "slugs"
+    slugs_dir.mkdir(parents=True)
+    (slugs_dir / "pep.json").write_text(json.dumps([
+        {"name": name, "slug": name} for name in ["a", "b", "a", "c"]
+    ]))
+
+    failing = {"b"}
+    fetched = []
+
+    async def fake_get_text(self, url, params=None):
+        slug = url.rsplit("/", 1)[1]
+        fetched.append(slug)
+        return None if slug in failing else PRODUCT_PAGE.format(name=slug.upper())
+
+    monkeypatch.setattr(scrape_core.Fetcher, "get_text", fake_get_text)
+
+    await ingredients_from_slugs.main()
+    assert sorted(fetched) == ["a", "b", "c"]
+
+    # Simulate a run killed mid-write, then resume once the site recovers
+    progress = tmp_path / "data" / "peptides" / "pep.jsonl"
+    with open(progress, "ab") as f:
+        f.write(b'{"name": "torn')
+    failing.clear()
+    fetched.clear()
+
+    await ingredients_from_slugs.main()
+    assert fetched == ["b"]
+
+    saved = json.loads((tmp_path / "data" / "peptides" / "pep.json").read_text())
+    assert saved["peptide"] == "Pep"
+    assert [p["slug"] for p in saved["products"]] == ["a", "b", "c"]
+    assert saved["products"][1]["ingredients"][1] == {
+        "name": "Glycerin", "function": "moisturiser", "irr_com": "0, 0", "rating": "superstar"
+    }
+
+
+@pytest.mark.asyncio
+async def test_fetcher_spaces_requests_at_the_configured_rate():
+    sent = []
+
+    def handler(request):
+        sent.append(time.monotonic())
+        return httpx.Response(200, text="page")
+
+    async with (await mock_fetcher(handler, cache_dir=None, rate=20.0)) as fetcher:
+        await asyncio.gather(*(fetcher.get_text(f"https://example.test/{i}") for i in range(5)))
+
+    gaps = [b - a for a, b in zip(sent, sent[1:])]
+    assert len(gaps) == 4
+    assert min(gaps) >= 0.045
+
+
+@pytest.fixture
+def retry_sleeps(monkeypatch):
+    """Record the Fetcher's retry waits instead of sleeping through them"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(scrape_core.asyncio, "sleep", record_sleep)
+    return delays
+
+
+@pytest.mark.asyncio
+async def test_fetcher_retries_transient_failures_with_backoff(retry_sleeps):
+    statuses = iter([503, 502, 200])
+
+    def handler(request):
+        return httpx.Response(next(statuses), text="page")
+
+    async with (await mock_fetcher(handler, cache_dir=None, rate=0)) as fetcher:
+        assert await fetcher.get_text("https://example.test/p") == "page"
+
+    # Exponential backoff with up to BACKOFF_BASE of jitter
+    assert len(retry_sleeps) == 2
+    assert 1.0 <= retry_sleeps[0] < 2.0
+    assert 2.0 <= retry_sleeps[1] < 3.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("retry_after, expected", [
+    ("3", 3.0),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+    ("3600", scrape_core.BACKOFF_MAX)
+])
+async def test_fetcher_honours_retry_after(retry_sleeps, retry_after, expected):
+    responses = iter([httpx.Response(429, headers={"Retry-After": retry_after}), httpx.Response(200, text="page")])
+
+    async with (await mock_fetcher(lambda request: next(responses), cache_dir=None, rate=0)) as fetcher:
+        assert await fetcher.get_text("https://example.test/p") == "page"
+    assert retry_sleeps == [expected]
+
+
+@pytest.mark.asyncio
+async def test_fetcher_gives_up_after_max_attempts(tmp_path, retry_sleeps):
+    attempts = []
+    online = True
+
+    def handler(request):
+        attempts.append(request.url.path)
+        if not online:
+            raise httpx.ConnectError("offline", request=request)
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, text="page")
+
+    async with (await mock_fetcher(handler, cache_dir=str(tmp_path), cache_ttl=0, rate=0)) as fetcher:
+        # Non-transient statuses are not retried
+        assert await fetcher.get_text("https://example.test/missing") is None
+        assert attempts == ["/missing"]
+
+        assert await fetcher.get_text("https://example.test/p") == "page"
+        online = False
+        attempts.clear()
+
+        # Exhausted retries fall back to the cached copy, or None without one
+        assert await fetcher.get_text("https://example.test/p") == "page"
+        assert await fetcher.get_text("https://example.test/new") is None
+    assert attempts == ["/p"] * scrape_core.MAX_ATTEMPTS + ["/new"] * scrape_core.MAX_ATTEMPTS